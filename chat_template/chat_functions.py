@@ -1,77 +1,50 @@
-from anthropic.types import Message
-
-def add_user_message(messages, message):
-    user_message = {
-        "role": "user",
-        "content": message.content if isinstance(message, Message) else message,
-    }
-    messages.append(user_message)
-
-def add_assistant_message(messages, message):
-    if isinstance(message, list):
-        assistant_message = {
-            "role": "assistant",
-            "content": message,
-        }
-    elif hasattr(message, "content"):
-        content_list = []
-        for block in message.content:
-            if block.type == "text":
-                content_list.append({"type": "text", "text": block.text})
-            elif block.type == "tool_use":
-                content_list.append(
-                    {
-                        "type": "tool_use",
-                        "id": block.id,
-                        "name": block.name,
-                        "input": block.input,
-                    }
-                )
-        assistant_message = {
-            "role": "assistant",
-            "content": content_list,
-        }
-    else:
-        # String messages need to be wrapped in a list with text block
-        assistant_message = {
-            "role": "assistant",
-            "content": [{"type": "text", "text": message}],
-        }
-    messages.append(assistant_message)
+from chat_template.message_ops import add_user_message, add_assistant_message, text_from_message
+from chat_template.client import get_client, get_async_client
 
 '''
 tool_choice values: {"type":"auto"}, {"type":"any"}, {"type":"auto"}, {"type":"tool","name":"TOOL_NAME"}
 '''
 
-def chat(model, client, messages, system : str = None, temperature : float = 1.0,  stop_sequences: dict = [], tools=None, tool_choice: dict={"type":"auto"}, betas=None):
-    params = {
+# Shared defaults, merged (PEP 584) with the per-call fields instead of rebuilding the dict key by key
+_BASE_PARAMS = {"max_tokens": 1024, "temperature": 1.0}
+
+def _build_params(model, messages, system, temperature, stop_sequences, tools, tool_choice, betas, extra_headers, max_tokens):
+    params = _BASE_PARAMS | {
         "model": model,
-        "max_tokens": 3156,
+        "max_tokens": max_tokens,
         "messages": messages,
         "temperature": temperature,
-        "stop_sequences": stop_sequences
     }
-    
-    if tool_choice:
-        params["tool_choice"] = tool_choice
+
+    if stop_sequences:
+        params["stop_sequences"] = stop_sequences
     if tools:
         params["tools"] = tools
+        # tool_choice is only accepted together with tools (default on the API side: auto)
+        if tool_choice:
+            params["tool_choice"] = tool_choice
     if system:
-        params["system"] = system  # System prompt!
+        params["system"] = system  # System prompt! (str or list of text blocks with cache_control)
     if betas:
         params["betas"] = betas
-    
-    
-    message = client.messages.create(**params)
-    return message
+    if extra_headers:
+        params["extra_headers"] = extra_headers
+    return params
 
+def chat(model, client, messages, system : str | list = None, temperature : float = 1.0,  stop_sequences: list[str] | None = None, tools=None, tool_choice: dict | None = None, betas: list[str] | None = None, extra_headers: dict = None, max_tokens: int = 1024):
+    params = _build_params(model, messages, system, temperature, stop_sequences, tools, tool_choice, betas, extra_headers, max_tokens)
+    message = (client or get_client()).messages.create(**params)
+    return message
 
-'''
-Extracting Text from Messages
-Since you're now returning full message objects, create a helper to extract text when needed:
-'''
+# Async Chat template: same params as chat(), client must be an AsyncAnthropic instance
+# client=None uses the shared pooled clients from chat_template/client.py
+async def achat(model, client, messages, system : str | list = None, temperature : float = 1.0,  stop_sequences: list[str] | None = None, tools=None, tool_choice: dict | None = None, betas: list[str] | None = None, extra_headers: dict = None, max_tokens: int = 1024):
+    params = _build_params(model, messages, system, temperature, stop_sequences, tools, tool_choice, betas, extra_headers, max_tokens)
+    message = await (client or get_async_client()).messages.create(**params)
+    return message
 
-def text_from_message(message):
-    return "\n".join(
-        [block.text for block in message.content if block.type == "text"]
-    )
+# Streaming variant of chat(): returns the stream manager (sync or async, depending on the client)
+# client=None streams through the shared sync client
+def stream_chat(model, client, messages, system : str | list = None, temperature : float = 1.0,  stop_sequences: list[str] | None = None, tools=None, tool_choice: dict | None = None, betas: list[str] | None = None, extra_headers: dict = None, max_tokens: int = 1024):
+    params = _build_params(model, messages, system, temperature, stop_sequences, tools, tool_choice, betas, extra_headers, max_tokens)
+    return (client or get_client()).messages.stream(**params)
@@ -1,4 +1,11 @@
-from tools.tool_use import run_tools
+import json
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from chat_template.client import get_client
+from chat_template.chat_functions import chat
+from chat_template.message_ops import add_user_message, add_assistant_message, text_from_message
+from tools.tool_use import run_tool_request, editor_path_key
 
 '''
 
@@ -16,53 +23,6 @@ Consider enabling fine-grained tool calling when:
 '''
 
 
-def text_from_message(message):
-    return "\n".join(
-        [block.text for block in message.content if block.type == "text"]
-    )
-
-def add_user_message(messages, message):
-    if isinstance(message, list):
-        user_message = {"role": "user","content": message}
-    else:
-        user_message = {
-            "role": "user",
-            "content": [{"type": "text", "text": message}],
-        }
-    messages.append(user_message)
-
-def add_assistant_message(messages, message):
-    if isinstance(message, list):
-        assistant_message = {
-            "role": "assistant",
-            "content": message,
-        }
-    elif hasattr(message, "content"):
-        content_list = []
-        for block in message.content:
-            if block.type == "text":
-                content_list.append({"type": "text", "text": block.text})
-            elif block.type == "tool_use":
-                content_list.append(
-                    {
-                        "type": "tool_use",
-                        "id": block.id,
-                        "name": block.name,
-                        "input": block.input,
-                    }
-                )
-        assistant_message = {
-            "role": "assistant",
-            "content": content_list,
-        }
-    else:
-        # String messages need to be wrapped in a list with text block
-        assistant_message = {
-            "role": "assistant",
-            "content": [{"type": "text", "text": message}],
-        }
-    messages.append(assistant_message)
-
 '''
 tool_choice values: {"type":"auto"}, {"type":"any"}, {"type":"auto"}, {"type":"tool","name":"TOOL_NAME"}
 '''
@@ -74,19 +34,21 @@ def chat_stream(
     messages,
     system=None,
     temperature=1.0,
-    stop_sequences=[],
+    stop_sequences: list[str] | None = None,
     tools=None,
     tool_choice=None,
-    betas=[],
+    betas: list[str] | None = None,
 ):
     params = {
         "model": model,
         "max_tokens": 1000,
         "messages": messages,
         "temperature": temperature,
-        "stop_sequences": stop_sequences,
     }
 
+    if stop_sequences:
+        params["stop_sequences"] = stop_sequences
+
     if tool_choice:
         params["tool_choice"] = tool_choice
 
@@ -99,44 +61,144 @@ def chat_stream(
     if betas:
         params["betas"] = betas
 
-    return client.beta.messages.stream(**params)
+    return (client or get_client()).beta.messages.stream(**params)
+
+FINE_GRAINED_BETAS = ["fine-grained-tool-streaming-2025-05-14"]
+
+def _try_parse_tool_input(buffer: str):
+    # Best-effort parse of a partial tool input: None until the JSON object is complete
+    try:
+        return json.loads(buffer)
+    except json.JSONDecodeError:
+        return None
+
+# Rolling summarization: once the transcript is over budget, the middle turns are condensed by a cheap model
+MAX_CTX_TOKENS = 32_000
+KEEP_LAST_MESSAGES = 4
+SUMMARY_MODEL = "claude-3-5-haiku-latest"
+
+SUMMARY_PROMPT = """
+Summarize the following conversation between a user and an assistant.
+Preserve every tool call (tool name, arguments and result) and every fact needed to continue the conversation.
+Answer only with the summary.
+
+<conversation>
+{history}
+</conversation>
+"""
+
+def _compact_history(model, client, messages, tools=None):
+    """Replaces messages[1:-KEEP_LAST_MESSAGES] with a single user summary block when over MAX_CTX_TOKENS."""
+    if len(messages) <= KEEP_LAST_MESSAGES + 1:
+        return
+
+    client = client or get_client()
+    count_params = {"model": model, "messages": messages}
+    if tools:
+        count_params["tools"] = tools
+    if client.messages.count_tokens(**count_params).input_tokens <= MAX_CTX_TOKENS:
+        return
+
+    # The kept tail must start on an assistant turn, so no tool_result loses its tool_use
+    start = len(messages) - KEEP_LAST_MESSAGES
+    while start > 1 and messages[start]["role"] != "assistant":
+        start -= 1
+    if start <= 1:
+        return
+
+    history = json.dumps(messages[1:start], default=str, indent=1)
+    summary = chat(
+        SUMMARY_MODEL,
+        client,
+        [{"role": "user", "content": SUMMARY_PROMPT.format(history=history)}],
+    )
+    messages[1:start] = [
+        {
+            "role": "user",
+            "content": [{"type": "text", "text": "Summary of the earlier conversation:\n" + text_from_message(summary)}],
+        }
+    ]
+
+def _run_after(previous, tool_request):
+    # Calls on the same file run one after the other: wait for the previous one, then run
+    if previous is not None:
+        previous.result()
+    return run_tool_request(tool_request)
 
 # Run conversation EXAMPLE
-def run_conversation(messages, tools=[], tool_choice=None, fine_grained=False):
-    while True:
-        with chat_stream(
-            messages,
-            tools=tools,
-            betas=["fine-grained-tool-streaming-2025-05-14"]
-            if fine_grained
-            else [],
-            tool_choice=tool_choice,
-        ) as stream:
-            for chunk in stream:
-                if chunk.type == "text":
-                    print(chunk.text, end="")
-
-                if chunk.type == "content_block_start":
-                    if chunk.content_block.type == "tool_use":
-                        print(f'\n>>> Tool Call: "{chunk.content_block.name}"')
-
-                if chunk.type == "input_json" and chunk.partial_json:
-                    print(chunk.partial_json, end="")
-
-                if chunk.type == "content_block_stop":
-                    print("\n")
-
-            response = stream.get_final_message()
-
-        add_assistant_message(messages, response)
-
-        if response.stop_reason != "tool_use":
-            break
-
-        tool_results = run_tools(response)
-        add_user_message(messages, tool_results)
-
-        if tool_choice:
-            break
+def run_conversation(model, client, messages, tools=None, tool_choice=None):
+    with ThreadPoolExecutor() as executor:
+        while True:
+            blocks = {}
+            json_buffers = {}
+            tool_futures = {}
+            # Editor file (real path) -> future of the last call submitted on it
+            path_tails = {}
+
+            def submit(tool_request):
+                # Calls on different files (and other tools) run in parallel, calls on the same file in order.
+                # A waiting call only waits on earlier submissions, which the pool dequeues first
+                key = editor_path_key(tool_request.name, tool_request.input)
+                if key is None:
+                    future = executor.submit(run_tool_request, tool_request)
+                else:
+                    future = path_tails[key] = executor.submit(_run_after, path_tails.get(key), tool_request)
+                tool_futures[tool_request.id] = future
+
+            with chat_stream(
+                model,
+                client,
+                messages,
+                tools=tools,
+                betas=FINE_GRAINED_BETAS,
+                tool_choice=tool_choice,
+            ) as stream:
+                for chunk in stream:
+                    if chunk.type == "text":
+                        print(chunk.text, end="")
+
+                    if chunk.type == "content_block_start":
+                        # Every block is recorded by index: input_json also streams for server_tool_use
+                        # blocks (web_search), which run on the API side and are not dispatched here
+                        block = blocks[chunk.index] = chunk.content_block
+                        if block.type == "tool_use":
+                            json_buffers[chunk.index] = ""
+                            print(f'\n>>> Tool Call: "{block.name}"')
+
+                    if chunk.type == "content_block_delta" and chunk.delta.type == "input_json_delta" and chunk.delta.partial_json:
+                        print(chunk.delta.partial_json, end="")
+                        block = blocks[chunk.index]
+                        if block.type == "tool_use" and block.id not in tool_futures:
+                            json_buffers[chunk.index] += chunk.delta.partial_json
+                            # Start the tool as soon as its arguments form a complete JSON object
+                            tool_input = _try_parse_tool_input(json_buffers[chunk.index])
+                            if tool_input is not None:
+                                submit(SimpleNamespace(id=block.id, name=block.name, input=tool_input))
+
+                    if chunk.type == "content_block_stop":
+                        print("\n")
+                        # Tools with no arguments (or unparsable partials) are dispatched on block completion
+                        block = chunk.content_block
+                        if block.type == "tool_use" and block.id not in tool_futures:
+                            submit(block)
+
+                response = stream.get_final_message()
+
+            add_assistant_message(messages, response)
+
+            if response.stop_reason != "tool_use":
+                break
+
+            tool_results = [
+                tool_futures[block.id].result()
+                for block in response.content
+                if block.type == "tool_use"
+            ]
+            add_user_message(messages, tool_results)
+
+            if tool_choice:
+                break
+
+            _compact_history(model, client, messages, tools)
 
     return messages
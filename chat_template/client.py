@@ -0,0 +1,63 @@
+import asyncio
+import functools
+import threading
+from anthropic import (
+    Anthropic,
+    AsyncAnthropic,
+    DefaultHttpxClient,
+    DefaultAsyncHttpxClient,
+    DEFAULT_CONNECTION_LIMITS,
+    Timeout,
+)
+
+'''
+Shared Anthropic clients.
+One pooled HTTP/2 transport per process: every request reuses the open connections
+instead of paying a new TCP+TLS handshake. The pool is sized for the eval concurrency.
+The async pool is bound to the event loop that opened it, so async clients are kept per loop.
+'''
+
+MAX_CONNECTIONS = 64
+HTTP_TIMEOUT = 60.0
+
+# Limits class of the HTTP package the SDK is built on (httpx or httpx2, depending on the version)
+_Limits = type(DEFAULT_CONNECTION_LIMITS)
+
+
+def _limits():
+    return _Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS)
+
+@functools.lru_cache(maxsize=1)
+def get_client() -> Anthropic:
+    return Anthropic(
+        http_client=DefaultHttpxClient(http2=True, limits=_limits(), timeout=Timeout(HTTP_TIMEOUT))
+    )
+
+def new_async_client() -> AsyncAnthropic:
+    """New pooled AsyncAnthropic, to be used (and closed) on a single event loop."""
+    return AsyncAnthropic(
+        http_client=DefaultAsyncHttpxClient(http2=True, limits=_limits(), timeout=Timeout(HTTP_TIMEOUT))
+    )
+
+
+# Running event loop -> its pooled async client. Entries of closed loops are dropped on the next lookup
+_async_clients = {}
+_async_clients_lock = threading.Lock()
+
+def get_async_client() -> AsyncAnthropic:
+    """Pooled AsyncAnthropic of the running event loop (must be called from a coroutine)."""
+    loop = asyncio.get_running_loop()
+    with _async_clients_lock:
+        for stale in [l for l in _async_clients if l.is_closed()]:
+            del _async_clients[stale]
+        client = _async_clients.get(loop)
+        if client is None:
+            client = _async_clients[loop] = new_async_client()
+    return client
+
+async def aclose_async_client():
+    """Closes the pooled client of the running event loop, if one was created."""
+    with _async_clients_lock:
+        client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
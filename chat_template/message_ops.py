@@ -0,0 +1,62 @@
+from functools import singledispatch
+
+'''
+Single implementation of the message helpers shared by chat_functions.py and chat_stream.py.
+Response objects are detected by duck typing (a `content` attribute), lists and strings by dispatch.
+'''
+
+_USER_ROLE = {"role": "user"}
+_ASSISTANT_ROLE = {"role": "assistant"}
+
+
+# Block type -> API dict builder, unknown block types are dropped
+_BUILDERS = {
+    "text": lambda b: {"type": "text", "text": b.text},
+    "tool_use": lambda b: {"type": "tool_use", "id": b.id, "name": b.name, "input": b.input},
+}
+
+def _blocks_to_content(message):
+    return [_BUILDERS[b.type](b) for b in message.content if b.type in _BUILDERS]
+
+
+# USER CONTENT
+def _user_content(message):
+    # list / str / dict blocks have no content attribute and are passed through as-is
+    content = getattr(message, "content", None)
+    return message if content is None else content
+
+
+# ASSISTANT CONTENT
+@singledispatch
+def _assistant_content(message):
+    # Response objects exposing content blocks (Message, beta stream messages, ...)
+    if getattr(message, "content", None) is not None:
+        return _blocks_to_content(message)
+    return [{"type": "text", "text": message}]
+
+@_assistant_content.register
+def _(message: list):
+    return message
+
+@_assistant_content.register
+def _(message: str):
+    # String messages need to be wrapped in a list with text block
+    return [{"type": "text", "text": message}]
+
+
+def add_user_message(messages, message):
+    messages.append({**_USER_ROLE, "content": _user_content(message)})
+
+def add_assistant_message(messages, message):
+    messages.append({**_ASSISTANT_ROLE, "content": _assistant_content(message)})
+
+
+'''
+Extracting Text from Messages
+Since you're now returning full message objects, create a helper to extract text when needed:
+'''
+
+def text_from_message(message):
+    return "\n".join(
+        [block.text for block in message.content if block.type == "text"]
+    )
@@ -1,16 +1,32 @@
-import json
-from statistics import mean
+import math
+import sqlite3
+import asyncio
+from collections import Counter
 from dotenv import load_dotenv
 load_dotenv()
 
-from anthropic import Anthropic
-from chat_template.chat_functions import chat, add_assistant_message, add_user_message
-from evaluation.model_grader import grade_by_model
+from anthropic.types.message_create_params import MessageCreateParamsNonStreaming
+from anthropic.types.messages.batch_create_params import Request
+
+from chat_template.client import get_client, new_async_client
+from chat_template.chat_functions import achat, add_user_message, text_from_message
+from evaluation.model_grader import (
+    grade_by_model,
+    grade_request_params,
+    parse_grade_text,
+    lookup_cached_grade,
+    store_cached_grade,
+)
 from evaluation.syntax_grader import grade_syntax
 
 from utils.dataset_creation import generate_dataset
+from utils import fast_json
+
+# Output budget per expected solution format
+FORMAT_MAX_TOKENS = {"regex": 256, "json": 1024, "python": 2048}
+DEFAULT_MAX_TOKENS = 1024
 
-def run_prompt(model, client, test_case):
+async def run_prompt(model, client, test_case):
     
     """Merges the prompt and test case input, then returns the result"""
     
@@ -21,22 +37,16 @@ def run_prompt(model, client, test_case):
     
     messages = []
     add_user_message(messages, prompt)
-    output = chat(model, client, messages)
+    max_tokens = FORMAT_MAX_TOKENS.get(test_case["format"], DEFAULT_MAX_TOKENS)
+    output = text_from_message(await achat(model, client, messages, max_tokens=max_tokens))
     return output
 
-def run_test_case(model, client, test_case):
-    
-    """Calls run_prompt, then grades the result"""
-    
-    output = run_prompt(model, client, test_case)
+def _build_result(test_case, output, model_grade):
     
     ### Grading Strategy (Model, user, code)
     
     ## 1) model
     
-    # Grade the output
-    model_grade = grade_by_model(test_case, output)
-    
     model_score = model_grade["score"]
     reasoning = model_grade["reasoning"]
     strengths = model_grade['strengths']
@@ -58,24 +68,221 @@ def run_test_case(model, client, test_case):
         "weaknesses": weaknesses
     }
 
-def run_eval(model, client, dataset):
-    """Loads the dataset and calls (run_test_case) -> (run_prompt) for each case"""
-    results = []
+async def run_test_case(model, client, test_case, early_reject_threshold=None):
     
-    for test_case in dataset:
-        result = run_test_case(model, client, test_case)
-        results.append(result)
+    """Calls run_prompt, then grades the result"""
+    
+    output = await run_prompt(model, client, test_case)
+    
+    # Grade the output (grading stops at the score when it is below early_reject_threshold)
+    model_grade = await grade_by_model(
+        model, client, test_case, output, early_reject_threshold=early_reject_threshold
+    )
+    
+    return _build_result(test_case, output, model_grade)
+
+# Message Batches grading: ~50% cheaper and higher throughput, but results are asynchronous (minutes)
+BATCH_MIN_SIZE = 4
+BATCH_POLL_INTERVAL = 10
+
+async def grade_batch(model, client, dataset, outputs):
+    """
+    Grades every (test_case, output) pair through one Message Batch.
+    Cached grades are reused; failed batch entries are retried with the per-request grader.
+    """
+    grades = [lookup_cached_grade(model, test_case, output) for test_case, output in zip(dataset, outputs)]
+    requests = [
+        Request(
+            custom_id=str(i),
+            params=MessageCreateParamsNonStreaming(**grade_request_params(model, dataset[i], outputs[i])),
+        )
+        for i, grade in enumerate(grades)
+        if grade is None
+    ]
+
+    if requests:
+        batch = await client.messages.batches.create(requests=requests)
+        while batch.processing_status != "ended":
+            await asyncio.sleep(BATCH_POLL_INTERVAL)
+            batch = await client.messages.batches.retrieve(batch.id)
+
+        async for entry in await client.messages.batches.results(batch.id):
+            if entry.result.type != "succeeded":
+                continue
+            i = int(entry.custom_id)
+            grades[i] = parse_grade_text(text_from_message(entry.result.message))
+            store_cached_grade(model, dataset[i], outputs[i], grades[i])
+
+    for i, grade in enumerate(grades):
+        if grade is None:
+            grades[i] = await grade_by_model(model, client, dataset[i], outputs[i])
+
+    return grades
+
+# Percentiles come from a histogram of scores on this grid: the combined score is the mean of two
+# 1-10 grades, so integer grades land exactly on a bin; other values are counted in the nearest one
+SCORE_BIN_WIDTH = 0.5
+
+class ScoreStats:
+    """Single-pass score accumulator: running mean/variance (Welford) plus p50/p95 from a bounded histogram."""
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        # Bin index -> number of scores, at most ~20 bins over the 0-10 range
+        self._bins = Counter()
+
+    def add(self, score):
+        self.count += 1
+        delta = score - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (score - self.mean)
+        self._bins[round(score / SCORE_BIN_WIDTH)] += 1
+
+    @property
+    def variance(self):
+        return self._m2 / self.count if self.count else 0.0
+
+    def percentile(self, p):
+        # Nearest-rank percentile, walking the bins in score order
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for bin_index in sorted(self._bins):
+            seen += self._bins[bin_index]
+            if seen >= rank:
+                return bin_index * SCORE_BIN_WIDTH
+        return max(self._bins) * SCORE_BIN_WIDTH
+
+def _report_progress(completed, total):
+    # Print at every 20% milestone
+    if completed * 5 // total > (completed - 1) * 5 // total:
+        print(f"Graded {completed}/{total} test cases")
+
+async def _run_eval_async(model, client, dataset, max_concurrency, use_batches, early_reject_threshold, on_result):
+    if client is None:
+        # Pooled client owned by this run: its connections are bound to this event loop
+        async with new_async_client() as client:
+            return await _run_eval_async(model, client, dataset, max_concurrency, use_batches, early_reject_threshold, on_result)
+
+    # Bound in-flight requests so the fan-out stays under the account rate limits
+    semaphore = asyncio.Semaphore(max_concurrency)
+    stats = ScoreStats()
+    total = len(dataset)
+
+    async def bounded(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    async def indexed(i, coroutine):
+        return i, await bounded(coroutine)
+
+    # Small datasets are not worth the batch latency: grade them request by request
+    if not use_batches or total < BATCH_MIN_SIZE:
+        pending = [
+            indexed(i, run_test_case(model, client, test_case, early_reject_threshold))
+            for i, test_case in enumerate(dataset)
+        ]
+        for completed, next_done in enumerate(asyncio.as_completed(pending), 1):
+            i, result = await next_done
+            stats.add(result["score"])
+            on_result(i, result)
+            _report_progress(completed, total)
+        return stats
+
+    outputs = await asyncio.gather(
+        *[bounded(run_prompt(model, client, test_case)) for test_case in dataset]
+    )
+    grades = await grade_batch(model, client, dataset, outputs)
+    for i, (test_case, output, grade) in enumerate(zip(dataset, outputs, grades)):
+        result = _build_result(test_case, output, grade)
+        stats.add(result["score"])
+        on_result(i, result)
+    return stats
+
+# SQLite results store: one JSON payload per (run, dataset index) row, committed every RESULTS_COMMIT_EVERY rows
+RESULTS_DB = "eval_results.db"
+RESULTS_COMMIT_EVERY = 50
+
+def _open_results_db(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE IF NOT EXISTS eval_runs(id INTEGER PRIMARY KEY AUTOINCREMENT)")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS eval_results("
+        "run_id INTEGER NOT NULL, idx INTEGER NOT NULL, payload JSON, PRIMARY KEY(run_id, idx))"
+    )
+    return conn
+
+def load_results(db_path=RESULTS_DB, run_id=None):
+    """
+    Iterates the results of one run_eval(results_db=...) call one row at a time, in dataset order.
+    run_id is the value returned by run_eval, None reads the latest run.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        if run_id is None:
+            (run_id,) = conn.execute("SELECT MAX(id) FROM eval_runs").fetchone()
+        rows = conn.execute("SELECT payload FROM eval_results WHERE run_id = ? ORDER BY idx", (run_id,))
+        for (payload,) in rows:
+            yield fast_json.loads(payload)
+    finally:
+        conn.close()
+
+def run_eval(model, client, dataset, max_concurrency: int = 5, use_batches: bool = True, early_reject_threshold: float = None, results_db: str = None):
+    """
+    Runs every test case of the dataset concurrently: (run_test_case) -> (run_prompt) + grading.
+    client must be an AsyncAnthropic instance, or None for a pooled client created and closed by this run.
+    Every call runs its own event loop, so a client passed in must not be bound to another loop.
+    max_concurrency bounds the in-flight test cases.
+    With use_batches, datasets of BATCH_MIN_SIZE or more cases are graded through the Message Batches API.
+    early_reject_threshold (per-request grading only) stops a grade as soon as its score is below it.
+    With results_db, results are written to that SQLite file as they complete instead of being kept
+    in memory: the function then returns the run id and results are read back with load_results().
+    """
+    if results_db is None:
+        results = [None] * len(dataset)
+
+        def on_result(i, result):
+            results[i] = result
+
+        stats = asyncio.run(_run_eval_async(model, client, dataset, max_concurrency, use_batches, early_reject_threshold, on_result))
+    else:
+        conn = _open_results_db(results_db)
+        # Each call is its own run: rows of earlier runs in the same file are kept apart
+        run_id = conn.execute("INSERT INTO eval_runs DEFAULT VALUES").lastrowid
+        conn.commit()
+        results = run_id
+        written = 0
+
+        def on_result(i, result):
+            nonlocal written
+            conn.execute(
+                "INSERT INTO eval_results(run_id, idx, payload) VALUES(?, ?, ?)",
+                (run_id, i, fast_json.dumps(result)),
+            )
+            written += 1
+            if written % RESULTS_COMMIT_EVERY == 0:
+                conn.commit()
+
+        try:
+            stats = asyncio.run(_run_eval_async(model, client, dataset, max_concurrency, use_batches, early_reject_threshold, on_result))
+        finally:
+            conn.commit()
+            conn.close()
     
     # Evaluate prompt results
-    average_score = mean([result["score"] for result in results])
-    print(f"Average score: {average_score}")
+    print(
+        f"Average score: {stats.mean:.2f} "
+        f"(variance {stats.variance:.2f}, p50 {stats.percentile(50)}, p95 {stats.percentile(95)})"
+    )
     
     return results
 
 
 #### USAGE EXAMPLE ####
 
-client = Anthropic()
+client = get_client()
 model = "claude-sonnet-4-0"
 messages = []
 
@@ -103,8 +310,9 @@ Please generate 3 objects.
 
 dataset = generate_dataset(client, model, gen_dataset_prompt)
 with open("dataset.json", "w") as f:
-    json.dump(dataset, f, indent=2)
+    f.write(fast_json.dumps(dataset, indent=True))
 
-# results have keys: (output, test_case, score)
-results = run_eval(model, client, dataset)
-print(json.dumps(results, indent=2))
\ No newline at end of file
+# results have keys: (output, test_case, score), streamed to SQLite as they complete
+run_id = run_eval(model, None, dataset, results_db=RESULTS_DB)
+for result in load_results(RESULTS_DB, run_id):
+    print(fast_json.dumps(result, indent=True))
\ No newline at end of file
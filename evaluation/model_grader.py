@@ -1,7 +1,14 @@
 import json
+import string
+import hashlib
+import functools
+import ijson
+from diskcache import Cache
 from dotenv import load_dotenv
 load_dotenv()
-from chat_template.chat_functions import chat,add_assistant_message,add_user_message
+from chat_template.chat_functions import chat,stream_chat,add_assistant_message,add_user_message,text_from_message
+from chat_template.client import get_async_client
+from utils import fast_json
 
 
 def grade_by_model_2(model, client, test_case, output):
@@ -23,47 +30,169 @@ def grade_by_model_2(model, client, test_case, output):
     add_user_message(messages, eval_prompt)
     add_assistant_message(messages, "```json")
     
-    eval_text = chat(model, client, messages, stop_sequences=["```"])
-    return json.loads(eval_text)
+    eval_text = text_from_message(chat(model, client, messages, stop_sequences=["```"]))
+    return parse_grade_text(eval_text)
 
-def grade_by_model(model, client, test_case, output):
-    eval_prompt = f"""
-    You are an expert AWS code reviewer. Your task is to evaluate the following AI-generated solution.
+# Static rubric shared by every grading call, sent as the system block; only the variable fields
+# go in the user turn. No cache_control breakpoint: at ~200 tokens the rubric is far below the
+# minimum cacheable prefix (1024 tokens on Sonnet / Opus), so the API would ignore it
+STATIC_RUBRIC = """
+You are an expert AWS code reviewer. Your task is to evaluate an AI-generated solution.
 
-    Original Task:
-    <task>
-    {test_case["task"]}
-    </task>
+The user turn contains:
+- <task>: the original task
+- <solution>: the solution to evaluate
+- <kpi>: the KPI you should use to evaluate the solution
+- <format>: the expected format of the solution
 
-    Solution to Evaluate:
-    <solution>
-    {output}
-    </solution>
-    
-    KPI you should use to Evaluate:
-    <kpi>
-    {test_case['kpi']}
-    </kpi>
+Output Format
+Provide your evaluation as a structured JSON object with the following fields, in this specific order:
+- "score": A number between 1-10
+- "strengths": An array of 1-3 key strengths
+- "weaknesses": An array of 1-3 key areas for improvement
+- "reasoning": A concise explanation of your overall assessment
 
-    Output Format
-    Provide your evaluation as a structured JSON object with the following fields, in this specific order:
-    - "strengths": An array of 1-3 key strengths
-    - "weaknesses": An array of 1-3 key areas for improvement
-    - "reasoning": A concise explanation of your overall assessment
-    - "score": A number between 1-10
+Keep your response concise and direct.
+Example response shape:
+{
+    "score": number,
+    "strengths": string[],
+    "weaknesses": string[],
+    "reasoning": string
+}
+"""
 
-    Respond with {test_case['format']}. Keep your response concise and direct.
-    Example response shape:
-    {{
-        "strengths": string[],
-        "weaknesses": string[],
-        "reasoning": string,
-        "score": number
-    }}
-    """
+GRADER_SYSTEM = [
+    {"type": "text", "text": STATIC_RUBRIC}
+]
+
+# The grade is a short JSON object, no need to reserve a large output budget
+GRADE_MAX_TOKENS = 512
+
+GRADE_CACHE_DIR = ".eval_cache"
+
+@functools.lru_cache(maxsize=1)
+def _grade_cache():
+    return Cache(GRADE_CACHE_DIR)
+
+def _grade_cache_key(model, test_case, output):
+    # Content-addressed key: the rubric is part of it so editing the prompt invalidates old grades
+    payload = {"t": test_case, "o": output, "m": model, "r": STATIC_RUBRIC}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+def lookup_cached_grade(model, test_case, output):
+    return _grade_cache().get(_grade_cache_key(model, test_case, output))
+
+def store_cached_grade(model, test_case, output, grade):
+    _grade_cache().set(_grade_cache_key(model, test_case, output), grade)
+
+def cached_grade(grader):
+    """On-disk response cache for grading coroutines with signature (model, client, test_case, output, ...)"""
+    @functools.wraps(grader)
+    async def wrapper(model, client, test_case, output, *args, **kwargs):
+        grade = lookup_cached_grade(model, test_case, output)
+        if grade is None:
+            grade = await grader(model, client, test_case, output, *args, **kwargs)
+            # Early-rejected grades are partial (no reasoning): only complete grades are cached
+            if grade["reasoning"] is not None:
+                store_cached_grade(model, test_case, output, grade)
+        return grade
+    return wrapper
+
+# Variable part of the grading prompt, compiled once at import
+_GRADE_USER_TMPL = string.Template("""
+<task>
+$task
+</task>
+
+<solution>
+$output
+</solution>
+
+<kpi>
+$kpi
+</kpi>
+
+<format>
+$fmt
+</format>
+""")
+
+def _grade_messages(test_case, output):
+    eval_prompt = _GRADE_USER_TMPL.substitute(
+        task=test_case["task"],
+        output=output,
+        kpi=test_case["kpi"],
+        fmt=test_case["format"],
+    )
 
     messages = []
     add_user_message(messages, eval_prompt)
     add_assistant_message(messages, "```json")
-    eval_text = chat(model, client, messages, stop_sequences=["```"])
-    return json.loads(eval_text)
\ No newline at end of file
+    return messages
+
+def grade_request_params(model, test_case, output):
+    """Non-streaming Messages API params of a grading call (used for Message Batches requests)."""
+    return {
+        "model": model,
+        "max_tokens": GRADE_MAX_TOKENS,
+        "system": GRADER_SYSTEM,
+        "messages": _grade_messages(test_case, output),
+        "stop_sequences": ["```"],
+    }
+
+def parse_grade_text(eval_text):
+    # Prefill + stop sequence leave only whitespace around the JSON object
+    return fast_json.loads(eval_text.strip())
+
+@cached_grade
+async def grade_by_model(model, client, test_case, output, on_field=None, early_reject_threshold=None):
+    async with stream_chat(
+        model,
+        client or get_async_client(),
+        _grade_messages(test_case, output),
+        system=GRADER_SYSTEM,
+        stop_sequences=["```"],
+        max_tokens=GRADE_MAX_TOKENS,
+    ) as stream:
+        # Returning from inside the context manager closes the HTTP response early
+        return await _parse_grade_stream(stream.text_stream, on_field, early_reject_threshold)
+
+
+GRADE_LIST_PREFIXES = {"strengths.item": "strengths", "weaknesses.item": "weaknesses"}
+GRADE_VALUE_PREFIXES = {"reasoning", "score"}
+
+async def _parse_grade_stream(text_stream, on_field=None, early_reject_threshold=None):
+    """
+    Feeds the streamed text into an incremental JSON parser and fills the grade as fields arrive.
+    on_field(name, value) is called for every parsed value. The score comes first: when it is below
+    early_reject_threshold parsing stops right away and the rest of the generation is abandoned.
+    """
+    grade = {"score": None, "strengths": [], "weaknesses": [], "reasoning": None}
+    events = ijson.sendable_list()
+    parser = ijson.parse_coro(events, use_float=True)
+
+    async for text in text_stream:
+        parser.send(text.encode("utf-8"))
+        for prefix, event, value in events:
+            if prefix == "" and event == "end_map":
+                return grade
+            if event not in ("string", "number"):
+                continue
+            if prefix in GRADE_LIST_PREFIXES:
+                field = GRADE_LIST_PREFIXES[prefix]
+                grade[field].append(value)
+            elif prefix in GRADE_VALUE_PREFIXES:
+                field = prefix
+                grade[field] = value
+            else:
+                continue
+            if on_field:
+                on_field(field, value)
+            if field == "score" and early_reject_threshold is not None and value < early_reject_threshold:
+                return grade
+        del events[:]
+
+    if grade["score"] is None:
+        raise ValueError("Grader response ended without a score")
+    return grade
@@ -1,35 +1,424 @@
+import io
 import json
-import concurrent.futures
-import re
+import asyncio
+import functools
+import hashlib
+import inspect
 import logging
 
 logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
 
+from concurrent.futures import ThreadPoolExecutor
+from diskcache import Cache
+from html import escape as _esc
+from string import Template
 from textwrap import dedent
 from statistics import mean
-from chat_template.chat_functions import chat, add_assistant_message, add_user_message
+from utils import fast_json
+from chat_template.client import new_async_client
+from chat_template.chat_functions import chat, achat, add_assistant_message, add_user_message, text_from_message
+
+# Prompt templates ($name placeholders), dedented and compiled once at import time
+_IDEAS_TEMPLATE = Template(dedent("""
+    Generate $num_cases unique, diverse ideas for testing a prompt that accomplishes this task:
+
+    <task_description>
+    $task_description
+    </task_description>
+
+    The prompt will receive the following inputs
+    <prompt_inputs>
+    $prompt_inputs_spec
+    </prompt_inputs>
+
+    Each idea should represent a distinct scenario or example that tests different aspects of the task.
+
+    Output Format:
+    Provide your response as a structured JSON array where each item is a brief description of the idea.
+
+    Example:
+    ```json
+    [
+        "Testing with technical computer science terminology",
+        "Testing with medical research findings",
+        "Testing with complex mathematical concepts",
+        ...
+    ]
+    ```
+
+    Ensure each idea is:
+    - Clearly distinct from the others
+    - Relevant to the task description
+    - Specific enough to guide generation of a full test case
+    - Quick to solve without requiring extensive computation or multi-step processing
+    - Solvable with no more than 400 tokens of output
+
+    Remember, only generate $num_cases unique ideas
+"""))
+
+# Prompts are sent as a static instructions block (cache_control breakpoint, not rendered)
+# followed by the rendered per-call fields: repeated calls reuse the cached prefix
+_CASE_INSTRUCTIONS = dedent("""
+    Generate a single detailed test case for a prompt evaluation.
+    The task description, the specific idea and the allowed input keys are given after these instructions.
+
+    IMPORTANT REQUIREMENTS:
+    - You MUST ONLY use the exact input keys listed in allowed_input_keys in your prompt_inputs
+    - Do NOT add any additional keys to prompt_inputs
+    - All keys listed in allowed_input_keys must be included in your response
+    - Make the test case realistic and practically useful
+    - Include measurable, concise solution criteria
+    - The solution criteria should ONLY address the direct requirements of the task description and the generated prompt_inputs
+    - Avoid over-specifying criteria with requirements that go beyond the core task
+    - Keep solution criteria simple, focused, and directly tied to the fundamental task
+    - The test case should be tailored to the specific idea provided
+    - Quick to solve without requiring extensive computation or multi-step processing
+    - Solvable with no more than 400 tokens of output
+    - DO NOT include any fields beyond those specified in the output format
+
+    Here's an example of a sample input with an ideal output:
+    <sample_input>
+    <sample_task_description>
+    Extract topics out of a passage of text
+    </sample_task_description>
+    <sample_specific_idea>
+    Testing with a text that contains multiple nested topics and subtopics (e.g., a passage about renewable energy that covers solar power economics, wind turbine technology, and policy implications simultaneously)
+    </sample_specific_idea>
+
+    <sample_allowed_input_keys>
+    "content"
+    </sample_allowed_input_keys>
+    </sample_input>
+    <ideal_output>
+    ```json
+    {
+        "prompt_inputs": {
+            "content": "The transition to renewable energy encompasses numerous interdependent dimensions. Solar photovoltaic technology has seen dramatic cost reductions, with panel efficiency improving 24% since 2010 while manufacturing costs declined by 89%, making it economically competitive with fossil fuels in many markets. Concurrently, wind energy has evolved through innovative turbine designs featuring carbon-fiber composite blades and advanced control systems that increase energy capture by 35% in low-wind conditions."
+        },
+        "solution_criteria": [
+            "Includes all topics mentioned"   
+        ]
+    }
+    ```
+    </ideal_output>
+    This is ideal output because the solution criteria is concise and doesn't ask for anything outside of the scope of the task description.
+""")
+
+_CASE_TEMPLATE = Template(dedent("""
+    <task_description>
+    $task_description
+    </task_description>
+
+    <specific_idea>
+    $idea
+    </specific_idea>
+
+    <allowed_input_keys>
+    $allowed_keys
+    </allowed_input_keys>
+
+    Output Format:
+    ```json
+    {
+        "prompt_inputs": {
+        $example_prompt_inputs
+        },
+        "solution_criteria": ["criterion 1", "criterion 2", ...] // Concise list of criteria for evaluating the solution, 1 to 4 items
+    }
+    ```
+
+    Remember: you MUST ONLY use these exact input keys in your prompt_inputs: $allowed_keys
+"""))
+
+_EXTRA_CRITERIA_TEMPLATE = Template(dedent("""
+    Mandatory Requirements - ANY VIOLATION MEANS AUTOMATIC FAILURE (score of 3 or lower):
+    <extra_important_criteria>
+    $extra_criteria
+    </extra_important_criteria>
+"""))
+
+_SCORING_GUIDELINES = dedent("""
+    Scoring Guidelines:
+    * Score 1-3: Solution fails to meet one or more MANDATORY requirements
+    * Score 4-6: Solution meets all mandatory requirements but has significant deficiencies in secondary criteria
+    * Score 7-8: Solution meets all mandatory requirements and most secondary criteria, with minor issues
+    * Score 9-10: Solution meets all mandatory and secondary criteria
+
+    IMPORTANT SCORING INSTRUCTIONS:
+    * Grade the output based ONLY on the listed criteria. Do not add your own extra requirements.
+    * If a solution meets all of the mandatory and secondary criteria give it a 10
+    * Don't complain that the solution "only" meets the mandatory and secondary criteria. Solutions shouldn't go above and beyond - they should meet the exact listed criteria.
+    * ANY violation of a mandatory requirement MUST result in a score of 3 or lower
+    * The full 1-10 scale should be utilized - don't hesitate to give low scores when warranted
+""")
+
+_EVAL_INSTRUCTIONS = dedent("""
+    Your task is to evaluate an AI-generated solution with EXTREME RIGOR.
+    The original task, its inputs, the solution and the evaluation criteria are given after these instructions.
+""") + _SCORING_GUIDELINES + dedent("""
+    Output Format
+    Submit your evaluation by calling the submit_grade tool with the following fields:
+    - "strengths": An array of 1-3 key strengths
+    - "weaknesses": An array of 1-3 key areas for improvement
+    - "reasoning": A concise explanation of your overall assessment
+    - "score": A number between 1-10
+
+    Keep your evaluation concise and direct.
+""")
+
+_EVAL_TEMPLATE = Template(dedent("""
+    Original task description:
+    <task_description>
+    $task_description
+    </task_description>
+
+    Original task inputs:
+    <task_inputs>
+    { $prompt_inputs }
+    </task_inputs>
+
+    Solution to Evaluate:
+    <solution>
+    $output
+    </solution>
+
+    Criteria you should use to evaluate the solution:
+    <criteria>
+    $solution_criteria
+    </criteria>
+
+    $extra_criteria_section
+"""))
+
+# Grades come back as forced tool calls: the input is already parsed and validated against the schema
+_GRADE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "strengths": {"type": "array", "items": {"type": "string"}},
+        "weaknesses": {"type": "array", "items": {"type": "string"}},
+        "reasoning": {"type": "string"},
+        "score": {"type": "integer", "minimum": 1, "maximum": 10},
+    },
+    "required": ["strengths", "weaknesses", "reasoning", "score"],
+}
+
+GRADE_TOOL = {
+    "name": "submit_grade",
+    "description": "Submit the evaluation of the solution.",
+    "input_schema": _GRADE_SCHEMA,
+}
+
+BATCH_GRADE_TOOL = {
+    "name": "submit_grades",
+    "description": "Submit the evaluations of all the cases, one grade per case.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "grades": {
+                "type": "array",
+                "items": {
+                    **_GRADE_SCHEMA,
+                    "properties": {"index": {"type": "integer"}, **_GRADE_SCHEMA["properties"]},
+                    "required": ["index", *_GRADE_SCHEMA["required"]],
+                },
+            },
+        },
+        "required": ["grades"],
+    },
+}
+
+def _tool_input(message):
+    for block in message.content:
+        if block.type == "tool_use":
+            return block.input
+    # e.g. stop_reason == "max_tokens" before the tool call was emitted
+    raise ValueError(f"No tool call in the grading response (stop_reason: {message.stop_reason})")
+
+# Multi-case grading: several solutions evaluated by a single model call
+GRADE_MAX_TOKENS = 1024  # output budget per graded case
+_BATCH_EVAL_INSTRUCTIONS = dedent("""
+    Your task is to evaluate each of a list of AI-generated solutions with EXTREME RIGOR.
+    The cases are given after these instructions. Every case is independent: grade each solution only against its own task, inputs and criteria.
+""") + _SCORING_GUIDELINES + dedent("""
+    Output Format
+    Submit your evaluation by calling the submit_grades tool with exactly one grade per case, in case order, each with the following fields:
+    - "index": The index of the case
+    - "strengths": An array of 1-3 key strengths
+    - "weaknesses": An array of 1-3 key areas for improvement
+    - "reasoning": A concise explanation of your overall assessment
+    - "score": A number between 1-10
+
+    Keep your evaluation concise and direct.
+""")
+
+_BATCH_CASE_TEMPLATE = Template(dedent("""
+    <case index="$index">
+    <task_description>
+    $task_description
+    </task_description>
+    <task_inputs>
+    { $prompt_inputs }
+    </task_inputs>
+    <solution>
+    $output
+    </solution>
+    <criteria>
+    $solution_criteria
+    </criteria>
+    </case>
+"""))
+
+_BATCH_EVAL_TEMPLATE = Template(dedent("""
+    <cases>
+    $cases
+    </cases>
+
+    $extra_criteria_section
+"""))
+
+GRADE_CACHE_DIR = ".grade_cache"
+
+@functools.lru_cache(maxsize=1)
+def _grade_cache():
+    return Cache(GRADE_CACHE_DIR)
+
+def _grade_cache_key(model, test_case, output, extra_criteria):
+    # Exact-match key over everything the grade depends on, the scoring guidelines included
+    payload = [
+        model,
+        test_case["task_description"],
+        sorted(test_case["solution_criteria"]),
+        test_case["prompt_inputs"],
+        output,
+        extra_criteria,
+        _SCORING_GUIDELINES,
+    ]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+# Newlines inside prompt input values are shown escaped on a single line
+_NEWLINE_ESC = str.maketrans({"\n": "\\n"})
+
+def _cached_prompt(instructions, rendered):
+    return [
+        {"type": "text", "text": instructions, "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": rendered},
+    ]
+
+# HTML report row, filled once per evaluation result
+_ROW_TEMPLATE = """
+                <tr>
+                    <td>{scenario}</td>
+                    <td class="prompt-inputs">{prompt_inputs}</td>
+                    <td class="criteria">• {criteria}</td>
+                    <td class="output"><pre>{output}</pre></td>
+                    <td class="score-col"><span class="score {score_class}">{score}</span></td>
+                    <td class="reasoning">{reasoning}</td>
+                </tr>
+            """
+
+
+# Prompt input keys repeat on every row: each label is escaped once (per process)
+@functools.lru_cache(maxsize=256)
+def _key_label(key):
+    return f"<strong>{_esc(key)}:</strong>"
+
+def _render_row(result):
+    prompt_inputs_html = "<br>".join(
+        f"{_key_label(key)} {_esc(str(value))}"
+        for key, value in result["test_case"]["prompt_inputs"].items()
+    )
+
+    criteria_string = "<br>• ".join(
+        _esc(criterion) for criterion in result["test_case"]["solution_criteria"]
+    )
+
+    score = result["score"]
+    if score >= 8:
+        score_class = "score-high"
+    elif score <= 5:
+        score_class = "score-low"
+    else:
+        score_class = "score-medium"
+
+    return _ROW_TEMPLATE.format(
+        scenario=_esc(result["test_case"]["scenario"]),
+        prompt_inputs=prompt_inputs_html,
+        criteria=criteria_string,
+        output=_esc(result["output"]),
+        score_class=score_class,
+        score=score,
+        reasoning=_esc(result["reasoning"]),
+    )
 
 # PromptEvaluator Implementation
 class PromptEvaluator:
-    def __init__(self, model, client, max_concurrent_tasks=3):
+    def __init__(self, model, client, max_concurrent_tasks=3, async_client=None):
         self.max_concurrent_tasks = max_concurrent_tasks
         self.client=client
+        # AsyncAnthropic used by the concurrent paths, None -> a pooled client owned by this evaluator,
+        # created with its event loop and closed by close()
+        self.async_client=async_client
+        self._owns_async_client = False
         self.model=model
+        # Repeated (task_description, idea, prompt inputs) test case prompts are rendered once
+        self._render_case_prompt = functools.lru_cache(maxsize=4096)(self._build_case_prompt)
+        # Grade cache key -> future of the grade currently being computed by the model
+        self._grades_in_flight = {}
+        # Event loop and worker threads (blocking run_prompt_function calls) live as long as the evaluator,
+        # created on first use: the async HTTP connection pool stays bound to the same loop across calls
+        self._runner = None
+        self._executor = None
+
+    def _run(self, coroutine):
+        if self._runner is None:
+            self._runner = asyncio.Runner()
+            if self.async_client is None:
+                self.async_client = new_async_client()
+                self._owns_async_client = True
+        return self._runner.run(coroutine)
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrent_tasks, thread_name_prefix="prompteval"
+            )
+        return self._executor
 
-    def render(self, template_string, variables):
-        placeholders = re.findall(r"{([^{}]+)}", template_string)
+    def close(self):
+        """Shuts down the worker threads and the event loop"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._runner is not None:
+            if self._owns_async_client:
+                self._runner.run(self.async_client.close())
+                self.async_client = None
+                self._owns_async_client = False
+            self._runner.close()
+            self._runner = None
 
-        result = template_string
-        for placeholder in placeholders:
-            if placeholder in variables:
-                result = result.replace(
-                    "{" + placeholder + "}", str(variables[placeholder])
-                )
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _as_completed(self, coroutines):
+        # All coroutines run on one event loop, at most max_concurrent_tasks of them in flight
+        semaphore = asyncio.Semaphore(self.max_concurrent_tasks)
+
+        async def bounded(coroutine):
+            async with semaphore:
+                return await coroutine
 
-        return result.replace("{{", "{").replace("}}", "}")
+        return asyncio.as_completed([bounded(coroutine) for coroutine in coroutines])
 
     # Report Builder
-    def generate_prompt_evaluation_report(evaluation_results):
+    @staticmethod
+    def generate_prompt_evaluation_report(evaluation_results, fh=None):
+        """Writes the HTML report to fh as it is built, or returns it as a string when fh is None"""
+        out = io.StringIO() if fh is None else fh
+
         total_tests = len(evaluation_results)
         scores = [result["score"] for result in evaluation_results]
         avg_score = mean(scores) if scores else 0
@@ -40,7 +429,7 @@ class PromptEvaluator:
             else 0
         )
 
-        html = f"""
+        out.write(f"""
         <!DOCTYPE html>
         <html lang="en">
         <head>
@@ -180,196 +569,60 @@ class PromptEvaluator:
                     </tr>
                 </thead>
                 <tbody>
-        """
+        """)
 
+        # Rows are rendered inline: shipping each row back from a worker process costs more than rendering it
         for result in evaluation_results:
-            prompt_inputs_html = "<br>".join(
-                [
-                    f"<strong>{key}:</strong> {value}"
-                    for key, value in result["test_case"]["prompt_inputs"].items()
-                ]
-            )
-
-            criteria_string = "<br>• ".join(
-                result["test_case"]["solution_criteria"]
-            )
-
-            score = result["score"]
-            if score >= 8:
-                score_class = "score-high"
-            elif score <= 5:
-                score_class = "score-low"
-            else:
-                score_class = "score-medium"
+            out.write(_render_row(result))
 
-            html += f"""
-                <tr>
-                    <td>{result["test_case"]["scenario"]}</td>
-                    <td class="prompt-inputs">{prompt_inputs_html}</td>
-                    <td class="criteria">• {criteria_string}</td>
-                    <td class="output"><pre>{result["output"]}</pre></td>
-                    <td class="score-col"><span class="score {score_class}">{score}</span></td>
-                    <td class="reasoning">{result["reasoning"]}</td>
-                </tr>
-            """
-
-        html += """
+        out.write("""
                 </tbody>
             </table>
         </body>
         </html>
-        """
+        """)
 
-        return html
+        if fh is None:
+            return out.getvalue()
 
     def generate_unique_ideas(
         self, task_description, prompt_inputs_spec, num_cases
     ):
         """Generate a list of unique ideas for test cases based on the task description"""
 
-        prompt = """
-        Generate {num_cases} unique, diverse ideas for testing a prompt that accomplishes this task:
-        
-        <task_description>
-        {task_description}
-        </task_description>
-
-        The prompt will receive the following inputs
-        <prompt_inputs>
-        {prompt_inputs_spec}
-        </prompt_inputs>
-        
-        Each idea should represent a distinct scenario or example that tests different aspects of the task.
-        
-        Output Format:
-        Provide your response as a structured JSON array where each item is a brief description of the idea.
-        
-        Example:
-        ```json
-        [
-            "Testing with technical computer science terminology",
-            "Testing with medical research findings",
-            "Testing with complex mathematical concepts",
-            ...
-        ]
-        ```
-        
-        Ensure each idea is:
-        - Clearly distinct from the others
-        - Relevant to the task description
-        - Specific enough to guide generation of a full test case
-        - Quick to solve without requiring extensive computation or multi-step processing
-        - Solvable with no more than 400 tokens of output
-
-        Remember, only generate {num_cases} unique ideas
-        """
-
         system_prompt = "You are a test scenario designer specialized in creating diverse, unique testing scenarios."
 
-        example_prompt_inputs = ""
-        for key, value in prompt_inputs_spec.items():
-            val = value.replace("\n", "\\n")
-            example_prompt_inputs += f'"{key}": str # {val},'
+        example_prompt_inputs = "".join(
+            f'"{key}": str # {value.translate(_NEWLINE_ESC)},'
+            for key, value in prompt_inputs_spec.items()
+        )
 
-        rendered_prompt = self.render(
-            dedent(prompt),
+        rendered_prompt = _IDEAS_TEMPLATE.safe_substitute(
             {
                 "task_description": task_description,
                 "num_cases": num_cases,
-                "prompt_inputs": example_prompt_inputs,
+                "prompt_inputs_spec": example_prompt_inputs,
             },
         )
 
         messages = []
         add_user_message(messages, rendered_prompt)
         add_assistant_message(messages, "```json")
-        text = chat(self.model, self.client, messages, stop_sequences=["```"], system=system_prompt, temperature=1.0)
-
-        return json.loads(text)
+        text = text_from_message(chat(self.model, self.client, messages, stop_sequences=["```"], system=system_prompt, temperature=1.0))
 
-    def generate_test_case(self, task_description, idea, prompt_inputs_spec={}):
-        """Generate a single test case based on the task description and a specific idea"""
+        return fast_json.loads(text)
 
-        example_prompt_inputs = ""
-        for key, value in prompt_inputs_spec.items():
-            val = value.replace("\n", "\\n")
-            example_prompt_inputs += f'"{key}": "EXAMPLE_VALUE", // {val}\n'
+    def _build_case_prompt(self, task_description, idea, prompt_inputs_items):
+        example_prompt_inputs = "".join(
+            f'"{key}": "EXAMPLE_VALUE", // {value.translate(_NEWLINE_ESC)}\n'
+            for key, value in prompt_inputs_items
+        )
 
         allowed_keys = ", ".join(
-            [f'"{key}"' for key in prompt_inputs_spec.keys()]
+            [f'"{key}"' for key, _ in prompt_inputs_items]
         )
 
-        prompt = """
-        Generate a single detailed test case for a prompt evaluation based on:
-        
-        <task_description>
-        {task_description}
-        </task_description>
-        
-        <specific_idea>
-        {idea}
-        </specific_idea>
-        
-        <allowed_input_keys>
-        {allowed_keys}
-        </allowed_input_keys>
-        
-        Output Format:
-        ```json
-        {{
-            "prompt_inputs": {{
-            {example_prompt_inputs}
-            }},
-            "solution_criteria": ["criterion 1", "criterion 2", ...] // Concise list of criteria for evaluating the solution, 1 to 4 items
-        }}
-        ```
-        
-        IMPORTANT REQUIREMENTS:
-        - You MUST ONLY use these exact input keys in your prompt_inputs: {allowed_keys}        
-        - Do NOT add any additional keys to prompt_inputs
-        - All keys listed in allowed_input_keys must be included in your response
-        - Make the test case realistic and practically useful
-        - Include measurable, concise solution criteria
-        - The solution criteria should ONLY address the direct requirements of the task description and the generated prompt_inputs
-        - Avoid over-specifying criteria with requirements that go beyond the core task
-        - Keep solution criteria simple, focused, and directly tied to the fundamental task
-        - The test case should be tailored to the specific idea provided
-        - Quick to solve without requiring extensive computation or multi-step processing
-        - Solvable with no more than 400 tokens of output
-        - DO NOT include any fields beyond those specified in the output format
-
-        Here's an example of a sample input with an ideal output:
-        <sample_input>
-        <sample_task_description>
-        Extract topics out of a passage of text
-        </sample_task_description>
-        <sample_specific_idea>
-        Testing with a text that contains multiple nested topics and subtopics (e.g., a passage about renewable energy that covers solar power economics, wind turbine technology, and policy implications simultaneously)
-        </sample_specific_idea>
-
-        <sample_allowed_input_keys>
-        "content"
-        </sample_allowed_input_keys>
-        </sample_input>
-        <ideal_output>
-        ```json
-        {
-            "prompt_inputs": {
-                "content": "The transition to renewable energy encompasses numerous interdependent dimensions. Solar photovoltaic technology has seen dramatic cost reductions, with panel efficiency improving 24% since 2010 while manufacturing costs declined by 89%, making it economically competitive with fossil fuels in many markets. Concurrently, wind energy has evolved through innovative turbine designs featuring carbon-fiber composite blades and advanced control systems that increase energy capture by 35% in low-wind conditions."
-            },
-            "solution_criteria": [
-                "Includes all topics mentioned"   
-            ]
-        }
-        ```
-        </ideal_output>
-        This is ideal output because the solution criteria is concise and doesn't ask for anything outside of the scope of the task description.
-        """
-
-        system_prompt = "You are a test case creator specializing in designing evaluation scenarios."
-
-        rendered_prompt = self.render(
-            dedent(prompt),
+        return _CASE_TEMPLATE.safe_substitute(
             {
                 "allowed_keys": allowed_keys,
                 "task_description": task_description,
@@ -378,12 +631,21 @@ class PromptEvaluator:
             },
         )
 
+    async def generate_test_case(self, task_description, idea, prompt_inputs_spec={}):
+        """Generate a single test case based on the task description and a specific idea (coroutine)"""
+
+        system_prompt = "You are a test case creator specializing in designing evaluation scenarios."
+
+        rendered_prompt = self._render_case_prompt(
+            task_description, idea, tuple(prompt_inputs_spec.items())
+        )
+
         messages = []
-        add_user_message(messages, rendered_prompt)
+        add_user_message(messages, _cached_prompt(_CASE_INSTRUCTIONS, rendered_prompt))
         add_assistant_message(messages, "```json")
-        text = chat(self.model, self.client, messages, stop_sequences=["```"], system=system_prompt, temperature=0.7)
+        text = text_from_message(await achat(self.model, self.async_client, messages, stop_sequences=["```"], system=system_prompt, temperature=0.7))
 
-        test_case = json.loads(text)
+        test_case = fast_json.loads(text)
         test_case["task_description"] = task_description
         test_case["scenario"] = idea
 
@@ -401,154 +663,195 @@ class PromptEvaluator:
             task_description, prompt_inputs_spec, num_cases
         )
 
+        dataset = self._run(
+            self._generate_test_cases(task_description, ideas, prompt_inputs_spec)
+        )
+
+        with open(output_file, "w", encoding="utf-8") as f:
+            f.write(fast_json.dumps(dataset, indent=True))
+
+        return dataset
+
+    async def _generate_test_cases(self, task_description, ideas, prompt_inputs_spec):
         dataset = []
         completed = 0
         total = len(ideas)
         last_reported_percentage = 0
 
-        with concurrent.futures.ThreadPoolExecutor(
-            max_workers=self.max_concurrent_tasks
-        ) as executor:
-            future_to_idea = {
-                executor.submit(
-                    self.generate_test_case,
-                    task_description,
-                    idea,
-                    prompt_inputs_spec,
-                ): idea
-                for idea in ideas
-            }
-
-            for future in concurrent.futures.as_completed(future_to_idea):
-                try:
-                    result = future.result()
-                    completed += 1
-                    current_percentage = int((completed / total) * 100)
-                    milestone_percentage = (current_percentage // 20) * 20
-
-                    if milestone_percentage > last_reported_percentage:
-                        print(f"Generated {completed}/{total} test cases")
-                        last_reported_percentage = milestone_percentage
-
-                    dataset.append(result)
-                except Exception as e:
-                    print(f"Error generating test case: {e}")
-
-        with open(output_file, "w") as f:
-            json.dump(dataset, f, indent=2)
+        for next_done in self._as_completed(
+            self.generate_test_case(task_description, idea, prompt_inputs_spec)
+            for idea in ideas
+        ):
+            try:
+                result = await next_done
+                completed += 1
+                current_percentage = int((completed / total) * 100)
+                milestone_percentage = (current_percentage // 20) * 20
+
+                if milestone_percentage > last_reported_percentage:
+                    print(f"Generated {completed}/{total} test cases")
+                    last_reported_percentage = milestone_percentage
+
+                dataset.append(result)
+            except Exception as e:
+                print(f"Error generating test case: {e}")
 
         return dataset
 
-    def grade_output(self, test_case, output, extra_criteria):
-        """Grade the output of a test case using the model"""
-
-        prompt_inputs = ""
-        for key, value in test_case["prompt_inputs"].items():
-            val = value.replace("\n", "\\n")
-            prompt_inputs += f'"{key}":"{val}",\n'
-
-        extra_criteria_section = ""
-        if extra_criteria:
-            extra_criteria_template = """
-            Mandatory Requirements - ANY VIOLATION MEANS AUTOMATIC FAILURE (score of 3 or lower):
-            <extra_important_criteria>
-            {extra_criteria}
-            </extra_important_criteria>
-            """
-            extra_criteria_section = self.render(
-                dedent(extra_criteria_template),
-                {"extra_criteria": extra_criteria},
-            )
+    def _format_prompt_inputs(self, test_case):
+        return "".join(
+            f'"{key}":"{value.translate(_NEWLINE_ESC)}",\n'
+            for key, value in test_case["prompt_inputs"].items()
+        )
 
-        eval_template = """
-        Your task is to evaluate the following AI-generated solution with EXTREME RIGOR.
-
-        Original task description:
-        <task_description>
-        {task_description}
-        </task_description>
-
-        Original task inputs:
-        <task_inputs>
-        {{ {prompt_inputs} }}
-        </task_inputs>
-
-        Solution to Evaluate:
-        <solution>
-        {output}
-        </solution>
-
-        Criteria you should use to evaluate the solution:
-        <criteria>
-        {solution_criteria}
-        </criteria>
-
-        {extra_criteria_section}
-
-        Scoring Guidelines:
-        * Score 1-3: Solution fails to meet one or more MANDATORY requirements
-        * Score 4-6: Solution meets all mandatory requirements but has significant deficiencies in secondary criteria
-        * Score 7-8: Solution meets all mandatory requirements and most secondary criteria, with minor issues
-        * Score 9-10: Solution meets all mandatory and secondary criteria
-
-        IMPORTANT SCORING INSTRUCTIONS:
-        * Grade the output based ONLY on the listed criteria. Do not add your own extra requirements.
-        * If a solution meets all of the mandatory and secondary criteria give it a 10
-        * Don't complain that the solution "only" meets the mandatory and secondary criteria. Solutions shouldn't go above and beyond - they should meet the exact listed criteria.
-        * ANY violation of a mandatory requirement MUST result in a score of 3 or lower
-        * The full 1-10 scale should be utilized - don't hesitate to give low scores when warranted
-
-        Output Format
-        Provide your evaluation as a structured JSON object with the following fields, in this specific order:
-        - "strengths": An array of 1-3 key strengths
-        - "weaknesses": An array of 1-3 key areas for improvement
-        - "reasoning": A concise explanation of your overall assessment
-        - "score": A number between 1-10
-
-        Respond with JSON. Keep your response concise and direct.
-        Example response shape:
-        {{
-            "strengths": string[],
-            "weaknesses": string[],
-            "reasoning": string,
-            "score": number
-        }}
-        """
-
-        eval_prompt = self.render(
-            dedent(eval_template),
+    def _extra_criteria_section(self, extra_criteria):
+        if not extra_criteria:
+            return ""
+        return _EXTRA_CRITERIA_TEMPLATE.safe_substitute(
+            {"extra_criteria": extra_criteria},
+        )
+
+    async def grade_output(self, test_case, output, extra_criteria):
+        """Grade the output of a test case using the model (coroutine)"""
+        return (await self.grade_outputs([test_case], [output], extra_criteria))[0]
+
+    async def grade_outputs(self, test_cases, outputs, extra_criteria):
+        """Grade several outputs with a single model call, one grade per test case in order (coroutine).
+        Grades already in the on-disk cache are reused, and identical (test case, output) pairs are
+        graded once: duplicates await the grade already in flight, only the remaining ones reach the model"""
+        cache = _grade_cache()
+        keys = [
+            _grade_cache_key(self.model, test_case, output, extra_criteria)
+            for test_case, output in zip(test_cases, outputs)
+        ]
+        grades = [cache.get(key) for key in keys]
+
+        pending = {}
+        missing = []
+        for i, (key, grade) in enumerate(zip(keys, grades)):
+            if grade is not None or key in pending:
+                continue
+            if key in self._grades_in_flight:
+                pending[key] = self._grades_in_flight[key]
+            else:
+                pending[key] = self._grades_in_flight[key] = asyncio.get_running_loop().create_future()
+                missing.append(i)
+
+        if missing:
+            try:
+                fresh = await self._grade_uncached(
+                    [test_cases[i] for i in missing], [outputs[i] for i in missing], extra_criteria
+                )
+                for i, grade in zip(missing, fresh):
+                    cache.set(keys[i], grade)
+                    pending[keys[i]].set_result(grade)
+            except BaseException as e:
+                for i in missing:
+                    if not pending[keys[i]].done():
+                        pending[keys[i]].set_exception(e)
+                raise
+            finally:
+                for i in missing:
+                    self._grades_in_flight.pop(keys[i], None)
+
+        for i, key in enumerate(keys):
+            if grades[i] is None:
+                grades[i] = await pending[key]
+        return grades
+
+    async def _grade_single(self, test_case, output, extra_criteria):
+        eval_prompt = _EVAL_TEMPLATE.safe_substitute(
             {
                 "task_description": test_case["task_description"],
-                "prompt_inputs": prompt_inputs,
+                "prompt_inputs": self._format_prompt_inputs(test_case),
                 "output": output,
                 "solution_criteria": "\n".join(test_case["solution_criteria"]),
-                "extra_criteria_section": extra_criteria_section,
+                "extra_criteria_section": self._extra_criteria_section(extra_criteria),
             },
         )
 
         messages = []
-        add_user_message(messages, eval_prompt)
-        add_assistant_message(messages, "```json")
-        eval_text = chat(self.model, self.client, messages, stop_sequences=["```"], temperature=0.0)
-        return json.loads(eval_text)
+        add_user_message(messages, _cached_prompt(_EVAL_INSTRUCTIONS, eval_prompt))
+        message = await achat(
+            self.model, self.async_client, messages, temperature=0.0,
+            tools=[GRADE_TOOL], tool_choice={"type": "tool", "name": GRADE_TOOL["name"]},
+        )
+        return _tool_input(message)
+
+    async def _grade_uncached(self, test_cases, outputs, extra_criteria):
+        if len(test_cases) == 1:
+            return [await self._grade_single(test_cases[0], outputs[0], extra_criteria)]
+
+        cases = "".join(
+            _BATCH_CASE_TEMPLATE.safe_substitute(
+                {
+                    "index": index,
+                    "task_description": test_case["task_description"],
+                    "prompt_inputs": self._format_prompt_inputs(test_case),
+                    "output": output,
+                    "solution_criteria": "\n".join(test_case["solution_criteria"]),
+                },
+            )
+            for index, (test_case, output) in enumerate(zip(test_cases, outputs))
+        )
+        eval_prompt = _BATCH_EVAL_TEMPLATE.safe_substitute(
+            {
+                "cases": cases,
+                "extra_criteria_section": self._extra_criteria_section(extra_criteria),
+            },
+        )
 
-    def run_test_case(
-        self, test_case, run_prompt_function, extra_criteria=None
-    ):
-        """Run a test case and grade the result"""
-        output = run_prompt_function(test_case["prompt_inputs"])
+        messages = []
+        add_user_message(messages, _cached_prompt(_BATCH_EVAL_INSTRUCTIONS, eval_prompt))
+        try:
+            message = await achat(
+                self.model, self.async_client, messages, temperature=0.0,
+                tools=[BATCH_GRADE_TOOL], tool_choice={"type": "tool", "name": BATCH_GRADE_TOOL["name"]},
+                max_tokens=GRADE_MAX_TOKENS * len(test_cases),
+            )
+            grades = {grade["index"]: grade for grade in _tool_input(message)["grades"]}
+            return [grades[index] for index in range(len(test_cases))]
+        except (ValueError, KeyError, TypeError) as e:
+            # Truncated or incomplete tool call: grade the cases of this batch one by one
+            logging.error(f"Batched grading failed, falling back to per-case grading: {e}")
+            return await asyncio.gather(
+                *[self._grade_single(test_case, output, extra_criteria) for test_case, output in zip(test_cases, outputs)]
+            )
 
-        model_grade = self.grade_output(test_case, output, extra_criteria)
-        model_score = model_grade["score"]
-        reasoning = model_grade["reasoning"]
+    async def _run_prompt(self, run_prompt_function, test_case):
+        # run_prompt_function may be async; blocking ones run in a worker thread off the event loop
+        if inspect.iscoroutinefunction(run_prompt_function):
+            return await run_prompt_function(test_case["prompt_inputs"])
+        return await asyncio.get_running_loop().run_in_executor(
+            self._get_executor(), run_prompt_function, test_case["prompt_inputs"]
+        )
 
+    def _build_result(self, test_case, output, model_grade):
         return {
             "output": output,
             "test_case": test_case,
-            "score": model_score,
-            "reasoning": reasoning,
+            "score": model_grade["score"],
+            "reasoning": model_grade["reasoning"],
         }
 
+    async def run_test_case(
+        self, test_case, run_prompt_function, extra_criteria=None
+    ):
+        """Run a test case and grade the result (coroutine)"""
+        output = await self._run_prompt(run_prompt_function, test_case)
+        model_grade = await self.grade_output(test_case, output, extra_criteria)
+        return self._build_result(test_case, output, model_grade)
+
+    async def _run_graded_batch(self, test_cases, run_prompt_function, extra_criteria):
+        outputs = await asyncio.gather(
+            *[self._run_prompt(run_prompt_function, test_case) for test_case in test_cases]
+        )
+        grades = await self.grade_outputs(test_cases, outputs, extra_criteria)
+        return [
+            self._build_result(test_case, output, grade)
+            for test_case, output, grade in zip(test_cases, outputs, grades)
+        ]
+
     def run_evaluation(
         self,
         run_prompt_function,
@@ -556,52 +859,51 @@ class PromptEvaluator:
         extra_criteria=None,
         json_output_file="output.json",
         html_output_file="output.html",
+        grade_batch_size=1,
     ):
-        """Run evaluation on all test cases in the dataset"""
-        with open(dataset_file, "r") as f:
-            dataset = json.load(f)
-
-        results = []
-        completed = 0
-        total = len(dataset)
-        last_reported_percentage = 0
-
-        with concurrent.futures.ThreadPoolExecutor(
-            max_workers=self.max_concurrent_tasks
-        ) as executor:
-            future_to_test_case = {
-                executor.submit(
-                    self.run_test_case,
-                    test_case,
-                    run_prompt_function,
-                    extra_criteria,
-                ): test_case
-                for test_case in dataset
-            }
-
-            for future in concurrent.futures.as_completed(future_to_test_case):
-                result = future.result()
-                completed += 1
-                current_percentage = int((completed / total) * 100)
-                milestone_percentage = (current_percentage // 20) * 20
+        """Run evaluation on all test cases in the dataset.
+        grade_batch_size > 1 grades that many outputs per model call (see grade_outputs)"""
+        with open(dataset_file, "rb") as f:
+            dataset = fast_json.loads(f.read())
 
-                if milestone_percentage > last_reported_percentage:
-                    print(f"Graded {completed}/{total} test cases")
-                    last_reported_percentage = milestone_percentage
-                results.append(result)
+        results = self._run(
+            self._run_test_cases(dataset, run_prompt_function, extra_criteria, grade_batch_size)
+        )
 
         average_score = mean([result["score"] for result in results])
         print(f"Average score: {average_score}")
 
-        with open(json_output_file, "w") as f:
-            json.dump(results, f, indent=2)
+        with open(json_output_file, "w", encoding="utf-8") as f:
+            f.write(fast_json.dumps(results, indent=True))
 
-        html = self.generate_prompt_evaluation_report(results)
         with open(html_output_file, "w", encoding="utf-8") as f:
-            f.write(html)
+            self.generate_prompt_evaluation_report(results, f)
 
         return results
 
+    async def _run_test_cases(self, dataset, run_prompt_function, extra_criteria, grade_batch_size=1):
+        results = []
+        completed = 0
+        total = len(dataset)
+        last_reported_percentage = 0
+
+        # Each unit of work runs and grades grade_batch_size test cases
+        batches = [dataset[i:i + grade_batch_size] for i in range(0, total, grade_batch_size)]
+        for next_done in self._as_completed(
+            self._run_graded_batch(batch, run_prompt_function, extra_criteria)
+            for batch in batches
+        ):
+            batch_results = await next_done
+            completed += len(batch_results)
+            current_percentage = int((completed / total) * 100)
+            milestone_percentage = (current_percentage // 20) * 20
+
+            if milestone_percentage > last_reported_percentage:
+                print(f"Graded {completed}/{total} test cases")
+                last_reported_percentage = milestone_percentage
+            results.extend(batch_results)
+
+        return results
 
 
 
@@ -637,11 +939,12 @@ def run_prompt(prompt_inputs):
 
     messages = []
     add_user_message(messages, prompt)
-    return chat(messages)
+    return text_from_message(chat(model, client, messages))
 
 results = evaluator.run_evaluation(
     run_prompt_function=run_prompt, dataset_file="dataset.json"
 )
+evaluator.close()
 
 
 
@@ -1,26 +1,42 @@
-import json
-import ast
 import re
+import functools
+from utils import fast_json
+
+# Validators are pure functions of the stripped response: duplicate responses are checked once
+VALIDATION_CACHE_SIZE = 1024
 
 #######################
 
 def validate_json(text):
+    return _validate_json(text.strip())
+
+@functools.lru_cache(maxsize=VALIDATION_CACHE_SIZE)
+def _validate_json(text):
     try:
-        json.loads(text.strip())
+        fast_json.loads(text)
         return 10
-    except json.JSONDecodeError:
+    except fast_json.JSONDecodeError:
         return 0
 
 def validate_python(text):
+    return _validate_python(text.strip())
+
+@functools.lru_cache(maxsize=VALIDATION_CACHE_SIZE)
+def _validate_python(text):
     try:
-        ast.parse(text.strip())
+        # Syntax check only: compile to bytecode without handing an AST back to Python
+        compile(text, "<response>", "exec", dont_inherit=True)
         return 10
-    except SyntaxError:
+    except (SyntaxError, ValueError):
         return 0
 
 def validate_regex(text):
+    return _validate_regex(text.strip())
+
+@functools.lru_cache(maxsize=VALIDATION_CACHE_SIZE)
+def _validate_regex(text):
     try:
-        re.compile(text.strip())
+        re.compile(text)
         return 10
     except re.error:
         return 0
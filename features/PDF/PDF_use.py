@@ -2,9 +2,16 @@ from chat_template.chat_functions import add_user_message, chat
 import base64
 
 file_name = "file.pdf"
+model = "claude-sonnet-4-0"
+
+# Encode in 3-byte aligned chunks (57 KiB -> 76 KiB of base64) so the raw file is never fully in memory
+B64_CHUNK_SIZE = 57 * 1024
 
 with open(file_name , "rb") as f:
-    file_bytes = base64.standard_b64encode(f.read()).decode("utf-8")
+    buf = bytearray()
+    while (chunk := f.read(B64_CHUNK_SIZE)):
+        buf.extend(base64.standard_b64encode(chunk))
+    file_bytes = buf.decode("ascii")
 
 prompt = "Summarize the document in one sentence"
 messages = []
@@ -27,4 +34,4 @@ add_user_message(
     ],
 )
 
-chat(messages)
\ No newline at end of file
+chat(model, None, messages)
\ No newline at end of file
@@ -1,30 +1,32 @@
 from pathlib import Path
+from types import MappingProxyType
+
+# Extension -> mime type, built once and shared read-only by every upload
+_MIME_TYPES = MappingProxyType({
+    ".pdf": "application/pdf",
+    ".txt": "text/plain",
+    ".md": "text/plain",
+    ".py": "text/plain",
+    ".js": "text/plain",
+    ".html": "text/plain",
+    ".css": "text/plain",
+    ".csv": "text/csv",
+    ".json": "application/json",
+    ".xml": "application/xml",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".xls": "application/vnd.ms-excel",
+    ".jpeg": "image/jpeg",
+    ".jpg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+})
+
 
 def upload(client,file_path):
     path = Path(file_path)
     extension = path.suffix.lower()
-
-    mime_type_map = {
-        ".pdf": "application/pdf",
-        ".txt": "text/plain",
-        ".md": "text/plain",
-        ".py": "text/plain",
-        ".js": "text/plain",
-        ".html": "text/plain",
-        ".css": "text/plain",
-        ".csv": "text/csv",
-        ".json": "application/json",
-        ".xml": "application/xml",
-        ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        ".xls": "application/vnd.ms-excel",
-        ".jpeg": "image/jpeg",
-        ".jpg": "image/jpeg",
-        ".png": "image/png",
-        ".gif": "image/gif",
-        ".webp": "image/webp",
-    }
-
-    mime_type = mime_type_map.get(extension)
+    mime_type = _MIME_TYPES.get(extension)
 
     if not mime_type:
         raise ValueError(f"Unknown mimetype for extension: {extension}")
@@ -46,7 +48,7 @@ def download_file(client, id, filename=None):
     file_content = client.beta.files.download(id)
 
     if not filename:
-        file_metadata = get_metadata(id)
+        file_metadata = get_metadata(client, id)
         file_content.write_to_file(file_metadata.filename)
     else:
         file_content.write_to_file(filename)
@@ -5,7 +5,7 @@ def chat(
     messages,
     system=None,
     temperature=1.0,
-    stop_sequences=[],
+    stop_sequences=None,
     tools=None,
     thinking=False,
     thinking_budget=1024,
@@ -15,9 +15,11 @@ def chat(
         "max_tokens": 4000,
         "messages": messages,
         "temperature": temperature,
-        "stop_sequences": stop_sequences,
     }
 
+    if stop_sequences:
+        params["stop_sequences"] = stop_sequences
+
     if thinking:
         params["thinking"] = {
             "type": "enabled",
@@ -1,8 +1,44 @@
 # BM25Index implementation
 import math, re
+import numpy as np
+from array import array
 from collections import Counter
 from typing import Callable, Optional, Any, List, Dict, Tuple
 
+# Optional JIT for the postings accumulation (pip install numba), NumPy otherwise
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Default tokenizer: runs of word characters, compiled once
+_TOKEN_RE = re.compile(r"\w+")
+
+def default_tokenizer(text: str) -> List[str]:
+    # Same tokens as splitting on \W+ and dropping empty strings, in one findall.
+    # Module-level so indexes using it share one tokenizer (see Retriever.add_documents)
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _accumulate_kernel(docs, term_freq, weight, bm25_norm, k1):
+    """Sums the BM25 contribution of each posting into its document, in one pass over the postings.
+    Returns the matching document indices (ascending) and their scores."""
+    acc = np.zeros(bm25_norm.shape[0], dtype=np.float64)
+    hit = np.zeros(bm25_norm.shape[0], dtype=np.bool_)
+    for i in range(docs.shape[0]):
+        d = docs[i]
+        tf = term_freq[i]
+        acc[d] += weight[i] * tf * (k1 + 1.0) / (tf + bm25_norm[d] + 1e-9)
+        hit[d] = True
+    candidate_docs = np.flatnonzero(hit)
+    return candidate_docs, acc[candidate_docs]
+
+if njit is not None:
+    _accumulate_jit = njit(cache=True, fastmath=True)(_accumulate_kernel)
+else:
+    _accumulate_jit = None
+
+
 class BM25Index:
     def __init__(
         self,
@@ -11,30 +47,33 @@ class BM25Index:
         tokenizer: Optional[Callable[[str], List[str]]] = None,
     ):
         self.documents: List[Dict[str, Any]] = []
-        self._corpus_tokens: List[List[str]] = []
         self._doc_len: List[int] = []
         self._doc_freqs: Dict[str, int] = {}
         self._avg_doc_len: float = 0.0
         self._idf: Dict[str, float] = {}
         self._index_built: bool = False
 
+        # Inverted index: token -> indices of the documents containing it, and its count in each
+        self._postings: Dict[str, array] = {}
+        self._postings_tf: Dict[str, array] = {}
+        # Query-independent k1 * (1 - b + b * doc_len / avg_doc_len) per document, set by _build_index
+        self._bm25_norm: np.ndarray = np.empty(0, dtype=np.float64)
+
         self.k1 = k1
         self.b = b
-        self._tokenizer = tokenizer if tokenizer else self._default_tokenizer
-
-    def _default_tokenizer(self, text: str) -> List[str]:
-        text = text.lower()
-        tokens = re.split(r"\W+", text)
-        return [token for token in tokens if token]
+        self._tokenizer = tokenizer if tokenizer else default_tokenizer
 
     def _update_stats_add(self, doc_tokens: List[str]):
+        doc_index = len(self._doc_len)
         self._doc_len.append(len(doc_tokens))
 
-        seen_in_doc = set()
-        for token in doc_tokens:
-            if token not in seen_in_doc:
-                self._doc_freqs[token] = self._doc_freqs.get(token, 0) + 1
-                seen_in_doc.add(token)
+        for token, term_freq in Counter(doc_tokens).items():
+            self._doc_freqs[token] = self._doc_freqs.get(token, 0) + 1
+            if token not in self._postings:
+                self._postings[token] = array("i")
+                self._postings_tf[token] = array("i")
+            self._postings[token].append(doc_index)
+            self._postings_tf[token].append(term_freq)
 
         self._index_built = False
 
@@ -54,6 +93,8 @@ class BM25Index:
 
         self._avg_doc_len = sum(self._doc_len) / len(self.documents)
         self._calculate_idf()
+        doc_len = np.asarray(self._doc_len, dtype=np.float64)
+        self._bm25_norm = self.k1 * (1 - self.b + self.b * (doc_len / self._avg_doc_len))
         self._index_built = True
 
     def add_document(self, document: Dict[str, Any]):
@@ -68,44 +109,81 @@ class BM25Index:
         if not isinstance(content, str):
             raise TypeError("Document 'content' must be a string.")
 
-        doc_tokens = self._tokenizer(content)
+        # "_tokens": content already tokenized with this index's tokenizer (set by the Retriever)
+        doc_tokens = document.get("_tokens")
+        if doc_tokens is None:
+            doc_tokens = self._tokenizer(content)
 
         self.documents.append(document)
-        self._corpus_tokens.append(doc_tokens)
         self._update_stats_add(doc_tokens)
 
-    def _compute_bm25_score(
-        self, query_tokens: List[str], doc_index: int
-    ) -> float:
-        score = 0.0
-        doc_term_counts = Counter(self._corpus_tokens[doc_index])
-        doc_length = self._doc_len[doc_index]
-
-        for token in query_tokens:
-            if token not in self._idf:
-                continue
-
-            idf = self._idf[token]
-            term_freq = doc_term_counts.get(token, 0)
-
-            numerator = idf * term_freq * (self.k1 + 1)
-            denominator = term_freq + self.k1 * (
-                1 - self.b + self.b * (doc_length / self._avg_doc_len)
+    def add_documents(self, documents: List[Dict[str, Any]]):
+        for document in documents:
+            self.add_document(document)
+
+    def _compute_bm25_scores(
+        self, query_tokens: List[str]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices of the documents sharing a term with the query, sorted, and their BM25 scores."""
+        # Unknown tokens score nothing; repeated tokens count once per occurrence
+        query_counts = Counter(token for token in query_tokens if token in self._idf)
+        if not query_counts:
+            return np.empty(0, dtype=np.intc), np.empty(0, dtype=np.float64)
+
+        postings = {
+            token: np.frombuffer(self._postings[token], dtype=np.intc)
+            for token in query_counts
+        }
+
+        if _accumulate_jit is not None:
+            # The query terms' postings are concatenated (document, tf, repeats * idf) and
+            # scored by the kernel, without the sort of np.unique over the candidates
+            docs = np.concatenate(list(postings.values()))
+            term_freq = np.concatenate(
+                [np.frombuffer(self._postings_tf[token], dtype=np.intc) for token in query_counts]
+            ).astype(np.float64)
+            weight = np.repeat(
+                np.fromiter((repeats * self._idf[token] for token, repeats in query_counts.items()),
+                            dtype=np.float64, count=len(query_counts)),
+                [len(postings[token]) for token in query_counts],
+            )
+            return _accumulate_jit(docs, term_freq, weight, self._bm25_norm, self.k1)
+
+        candidate_docs = np.unique(np.concatenate(list(postings.values())))
+        scores = np.zeros(len(candidate_docs), dtype=np.float64)
+
+        for token, repeats in query_counts.items():
+            docs = postings[token]
+            term_freq = np.frombuffer(self._postings_tf[token], dtype=np.intc).astype(np.float64)
+            # A token's postings hold each document once, so plain fancy-index accumulation is safe
+            scores[np.searchsorted(candidate_docs, docs)] += (
+                repeats * self._idf[token] * term_freq * (self.k1 + 1)
+                / (term_freq + self._bm25_norm[docs] + 1e-9)
             )
-            score += numerator / (denominator + 1e-9)
 
-        return score
+        return candidate_docs, scores
 
     def search(
         self,
         query_text: str,
         k: int = 1,
         score_normalization_factor: float = 0.1,
+        query_embedding: Optional[List[float]] = None,
     ) -> List[Tuple[Dict[str, Any], float]]:
+        # query_embedding is accepted for the Retriever's SearchIndex protocol, BM25 is lexical
+        return self.search_batch([query_text], k, score_normalization_factor)[0]
+
+    def search_batch(
+        self,
+        queries: List[str],
+        k: int = 1,
+        score_normalization_factor: float = 0.1,
+    ) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """Searches several queries, validating and building the index once for the batch."""
         if not self.documents:
-            return []
+            return [[] for _ in queries]
 
-        if not isinstance(query_text, str):
+        if not all(isinstance(query_text, str) for query_text in queries):
             raise TypeError("Query text must be a string.")
 
         if k <= 0:
@@ -115,22 +193,36 @@ class BM25Index:
             self._build_index()
 
         if self._avg_doc_len == 0:
-            return []
+            return [[] for _ in queries]
 
-        query_tokens = self._tokenizer(query_text)
+        # Each query only touches its own postings, so queries are scored one by one
+        # rather than into a dense (queries, documents) matrix
+        return [
+            self._search_tokens(self._tokenizer(query_text), k, score_normalization_factor)
+            for query_text in queries
+        ]
+
+    def _search_tokens(
+        self, query_tokens: List[str], k: int, score_normalization_factor: float
+    ) -> List[Tuple[Dict[str, Any], float]]:
         if not query_tokens:
             return []
 
-        raw_scores = []
-        for i in range(len(self.documents)):
-            raw_score = self._compute_bm25_score(query_tokens, i)
-            if raw_score > 1e-9:
-                raw_scores.append((raw_score, self.documents[i]))
+        candidate_docs, scores = self._compute_bm25_scores(query_tokens)
+        matching = scores > 1e-9
+        candidate_docs, scores = candidate_docs[matching], scores[matching]
 
-        raw_scores.sort(key=lambda item: item[0], reverse=True)
+        # Top-k selection in O(candidates): only scores reaching the k-th best are sorted,
+        # by decreasing score and then insertion order (candidate_docs is ascending)
+        if len(scores) > k:
+            kth_score = -np.partition(-scores, k - 1)[k - 1]
+            order = np.flatnonzero(scores >= kth_score)
+        else:
+            order = np.arange(len(scores))
+        order = order[np.argsort(-scores[order], kind="stable")][:k]
 
         normalized_results = []
-        for raw_score, doc in raw_scores[:k]:
+        for raw_score, doc in ((scores[i], self.documents[candidate_docs[i]]) for i in order):
             normalized_score = math.exp(-score_normalization_factor * raw_score)
             normalized_results.append((doc, normalized_score))
 
@@ -6,25 +6,85 @@ from rag.embedding.embeddings import generate_embedding
 dim = 384
 index = faiss.IndexFlatIP(dim)  # Inner product (cosine sim equiv. con normalizzazione)
 
+# Sotto questa soglia la ricerca esatta (Flat) è già veloce; sopra si passa a IVF
+IVF_MIN_VECTORS = 10_000
+# Numero di liste IVF visitate per query: più alto = recall migliore, ricerca più lenta
+NPROBE = 8
+# Liste IVF con vettori quantizzati a 8 bit (ScalarQuantizer): 4x meno memoria rispetto a float32
+QUANTIZE_8BIT = False
+
+# Inserimenti bufferizzati: index.add su blocchi float32 contigui di ADD_BATCH_SIZE vettori
+ADD_BATCH_SIZE = 1024
+_pending = []
+
 # Storage ausiliario per ID / metadati
 id_map = {}
 next_id = 0
 
+def build_ivf():
+    '''
+    Sostituisce l'indice Flat con un IndexIVFFlat (nlist = sqrt(N)), addestrato sui vettori già inseriti,
+    o con un IndexIVFScalarQuantizer a 8 bit se QUANTIZE_8BIT.
+    Gli ID restano invariati: i vettori vengono ri-aggiunti nello stesso ordine.
+    '''
+    global index
+    n = index.ntotal
+    vectors = index.reconstruct_n(0, n)
+    quantizer = faiss.IndexFlatIP(dim)
+    nlist = int(np.sqrt(n))
+    if QUANTIZE_8BIT:
+        ivf = faiss.IndexIVFScalarQuantizer(
+            quantizer, dim, nlist, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+        )
+    else:
+        ivf = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+    ivf.train(vectors)
+    ivf.add(vectors)
+    ivf.nprobe = NPROBE
+    index = ivf
+
+def to_gpu(device: int = 0):
+    '''Sposta l'indice su GPU se la build di FAISS lo supporta e c'è una GPU disponibile.'''
+    global index
+    flush_faiss()
+    if hasattr(faiss, "StandardGpuResources") and faiss.get_num_gpus() > 0:
+        index = faiss.index_cpu_to_gpu(faiss.StandardGpuResources(), device, index)
+    return index
+
+def flush_faiss():
+    '''Aggiunge all'indice i vettori in attesa; chiamata automaticamente prima di ogni ricerca.'''
+    if not _pending:
+        return
+    index.add(np.ascontiguousarray(np.stack(_pending), dtype=np.float32))
+    _pending.clear()
+    if index.ntotal >= IVF_MIN_VECTORS and isinstance(index, faiss.IndexFlat):
+        build_ivf()
+
 def insert_to_faiss(text: str, metadata: dict):
     global next_id
     embedding = generate_embedding(text)
-    index.add(np.array([embedding]))
+    _pending.append(np.asarray(embedding, dtype=np.float32))
     id_map[next_id] = {"text": text, "metadata": metadata}
     next_id += 1
+    if len(_pending) >= ADD_BATCH_SIZE:
+        flush_faiss()
 
 # ESEMPIO
 insert_to_faiss("To je slovensko besedilo.", {"lang": "sl"})
 
 # Ricerca
 def search_faiss(query: str, top_k=5):
+    flush_faiss()
     emb = generate_embedding(query)
-    D, I = index.search(np.array([emb]), top_k)
+    D, I = index.search(np.ascontiguousarray([emb], dtype=np.float32), top_k)
     results = []
     for idx in I[0]:
         results.append(id_map.get(idx, {}))
-    return results
\ No newline at end of file
+    return results
+
+# Ricerca batch: una sola chiamata index.search per tutte le query
+def search_faiss_batch(queries: list[str], top_k=5):
+    flush_faiss()
+    embs = [generate_embedding(query) for query in queries]
+    D, I = index.search(np.ascontiguousarray(embs, dtype=np.float32), top_k)
+    return [[id_map.get(idx, {}) for idx in row] for row in I]
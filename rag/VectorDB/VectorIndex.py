@@ -1,25 +1,88 @@
 import math
+import numpy as np
 from typing import Optional, Any, List, Dict, Tuple
 
+# Optional SIMD distance kernels (pip install simsimd), NumPy/BLAS otherwise
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
+
+# Rows allocated by the first insert, doubled whenever the matrix is full
+INITIAL_CAPACITY = 16
+
+# Unit-length components in [-1, 1] are stored as int8 in [-127, 127]
+INT8_SCALE = 127.0
+
 class VectorIndex:
     def __init__(
         self,
         distance_metric: str = "cosine",
         embedding_fn=None,
+        dtype=np.float32,
+        embedding_fn_batch=None,
+        embedding_batch_size: int = 128,
     ):
-        self.vectors: List[List[float]] = []
         self.documents: List[Dict[str, Any]] = []
         self._vector_dim: Optional[int] = None
+        # Contiguous (capacity, dim) rows of self._dtype, unit length for the cosine metric.
+        # The first self._count rows are in use, capacity doubles when full
+        self._matrix: Optional[np.ndarray] = None
+        self._count = 0
         if distance_metric not in ["cosine", "euclidean"]:
             raise ValueError("distance_metric must be 'cosine' or 'euclidean'")
         self._distance_metric = distance_metric
+        # Normalize once: for cosine, stored rows and queries are scaled to unit length at write /
+        # query time, so similarity is a plain dot product with no norms or division per pair.
+        # Zero vectors cannot be normalized and are stored as zeros: distance 1.0 to any
+        # non-zero query and 0.0 to a zero query, as in _cosine_distance
+        self._normalize = distance_metric == "cosine"
         self._embedding_fn = embedding_fn
+        # Optional List[str] -> List[vector] function, called with at most embedding_batch_size texts
+        self._embedding_fn_batch = embedding_fn_batch
+        self._embedding_batch_size = embedding_batch_size
+
+        # Storage dtype: float16 halves and int8 quarters the memory scanned per search
+        self._dtype = np.dtype(dtype)
+        if self._dtype not in (np.float32, np.float16, np.int8):
+            raise ValueError("dtype must be np.float32, np.float16 or np.int8")
+        if self._dtype == np.int8 and not self._normalize:
+            raise ValueError("int8 storage requires the cosine metric")
 
     def add_document(self, document: Dict[str, Any]):
         if not self._embedding_fn:
             raise ValueError(
                 "Embedding function not provided during initialization."
             )
+        self._check_document(document)
+
+        vector = self._embedding_fn(document["content"])
+        self.add_vector(vector=vector, document=document)
+
+    def add_documents(self, documents: List[Dict[str, Any]]):
+        """Adds several documents, embedding their contents in batches when embedding_fn_batch is set."""
+        if not self._embedding_fn_batch and not self._embedding_fn:
+            raise ValueError(
+                "Embedding function not provided during initialization."
+            )
+        for document in documents:
+            self._check_document(document)
+
+        contents = [document["content"] for document in documents]
+        if self._embedding_fn_batch:
+            size = self._embedding_batch_size
+            vectors = [
+                vector
+                for start in range(0, len(contents), size)
+                for vector in self._embedding_fn_batch(contents[start:start + size])
+            ]
+        else:
+            vectors = [self._embedding_fn(content) for content in contents]
+
+        for vector, document in zip(vectors, documents):
+            self.add_vector(vector=vector, document=document)
+
+    def _check_document(self, document: Dict[str, Any]):
         if not isinstance(document, dict):
             raise TypeError("Document must be a dictionary.")
         if "content" not in document:
@@ -27,58 +90,124 @@ class VectorIndex:
                 "Document dictionary must contain a 'content' key."
             )
 
-        content = document["content"]
-        if not isinstance(content, str):
+        if not isinstance(document["content"], str):
             raise TypeError("Document 'content' must be a string.")
 
-        vector = self._embedding_fn(content)
-        self.add_vector(vector=vector, document=document)
-
     def search(
-        self, query: Any, k: int = 1
+        self, query: Any, k: int = 1, query_embedding: Optional[List[float]] = None
     ) -> List[Tuple[Dict[str, Any], float]]:
-        if not self.vectors:
+        # A precomputed query_embedding skips embedding_fn for string queries
+        if query_embedding is not None:
+            query = [float(x) for x in query_embedding]
+        return self.search_batch([query], k=k)[0]
+
+    def search_batch(
+        self, queries: List[Any], k: int = 1
+    ) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """Searches several queries at once: one matrix product for the whole batch."""
+        if self._count == 0:
+            return [[] for _ in queries]
+
+        query_vectors = [self._query_vector(query) for query in queries]
+
+        if self._vector_dim is None:
+            return [[] for _ in queries]
+
+        for query_vector in query_vectors:
+            if len(query_vector) != self._vector_dim:
+                raise ValueError(
+                    f"Query vector dimension mismatch. Expected {self._vector_dim}, got {len(query_vector)}"
+                )
+
+        if k <= 0:
+            raise ValueError("k must be a positive integer.")
+
+        if not query_vectors:
             return []
 
+        distances = self._distances(np.asarray(query_vectors, dtype=np.float32))
+
+        # Top-k selection in O(N) per query, only the k winners are sorted
+        k = min(k, distances.shape[1])
+        top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        top = np.take_along_axis(
+            top, np.argsort(np.take_along_axis(distances, top, axis=1), axis=1), axis=1
+        )
+
+        return [
+            [(self.documents[i], float(row[i])) for i in row_top]
+            for row, row_top in zip(distances, top)
+        ]
+
+    def _query_vector(self, query: Any):
         if isinstance(query, str):
             if not self._embedding_fn:
                 raise ValueError(
                     "Embedding function not provided for string query."
                 )
-            query_vector = self._embedding_fn(query)
-        elif isinstance(query, list) and all(
+            return self._embedding_fn(query)
+        if isinstance(query, list) and all(
             isinstance(x, (int, float)) for x in query
         ):
-            query_vector = query
-        else:
-            raise TypeError(
-                "Query must be either a string or a list of numbers."
-            )
+            return query
+        raise TypeError(
+            "Query must be either a string or a list of numbers."
+        )
 
-        if self._vector_dim is None:
-            return []
+    @property
+    def vectors(self) -> np.ndarray:
+        """(count, dim) view of the stored vectors."""
+        if self._matrix is None:
+            return np.empty((0, 0), dtype=self._dtype)
+        return self._matrix[: self._count]
 
-        if len(query_vector) != self._vector_dim:
-            raise ValueError(
-                f"Query vector dimension mismatch. Expected {self._vector_dim}, got {len(query_vector)}"
-            )
+    def _get_matrix(self) -> np.ndarray:
+        return self._matrix[: self._count]
 
-        if k <= 0:
-            raise ValueError("k must be a positive integer.")
+    def _distances(self, query_vectors: np.ndarray) -> np.ndarray:
+        """(queries, count) distances from each query row to every stored vector."""
+        matrix = self._get_matrix()
 
-        if self._distance_metric == "cosine":
-            dist_func = self._cosine_distance
-        else:
-            dist_func = self._euclidean_distance
+        if simsimd is not None and self._normalize:
+            # SimSIMD has native f16 / i8 kernels: the query is quantized like the stored rows
+            unit_queries, _ = self._unit_rows(query_vectors)
+            return np.asarray(
+                simsimd.cdist(self._quantize(unit_queries), matrix, metric="cosine"),
+                dtype=np.float32,
+            )
+
+        # BLAS works in float32: quantized rows are widened (int8 back to unit length)
+        if self._dtype == np.int8:
+            matrix = matrix.astype(np.float32) / INT8_SCALE
+        elif self._dtype != np.float32:
+            matrix = matrix.astype(np.float32)
 
-        distances = []
-        for i, stored_vector in enumerate(self.vectors):
-            distance = dist_func(query_vector, stored_vector)
-            distances.append((distance, self.documents[i]))
+        if self._distance_metric == "euclidean":
+            # |x - q|^2 = |x|^2 + |q|^2 - 2 x.q, in float64 so near-duplicates do not cancel out
+            matrix64 = matrix.astype(np.float64)
+            queries64 = query_vectors.astype(np.float64)
+            squared = (
+                np.einsum("ij,ij->i", queries64, queries64)[:, None]
+                + np.einsum("ij,ij->i", matrix64, matrix64)[None, :]
+                - 2.0 * (queries64 @ matrix64.T)
+            )
+            return np.sqrt(np.maximum(squared, 0.0))
 
-        distances.sort(key=lambda item: item[0])
+        # Stored rows are unit length: cosine distance is 1 - dot product, one matrix product
+        # (clipped only against float rounding past +-1)
+        unit_queries, query_norms = self._unit_rows(query_vectors)
+        distances = 1.0 - np.clip(unit_queries @ matrix.T, -1.0, 1.0)
+        # Zero query: 0.0 from stored zero vectors, 1.0 from the rest
+        zero_queries = query_norms[:, 0] == 0
+        if zero_queries.any():
+            distances[zero_queries] = np.where(matrix.any(axis=1), 1.0, 0.0)
+        return distances
 
-        return [(doc, dist) for dist, doc in distances[:k]]
+    def _unit_rows(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Zero rows are kept as zeros
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        unit = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+        return unit, norms
 
     def add_vector(self, vector, document: Dict[str, Any]):
         if not isinstance(vector, list) or not all(
@@ -92,16 +221,39 @@ class VectorIndex:
                 "Document dictionary must contain a 'content' key."
             )
 
-        if not self.vectors:
+        if self._count == 0:
             self._vector_dim = len(vector)
         elif len(vector) != self._vector_dim:
             raise ValueError(
                 f"Inconsistent vector dimension. Expected {self._vector_dim}, got {len(vector)}"
             )
 
-        self.vectors.append(list(vector))
+        stored = np.asarray(vector, dtype=np.float32)
+        if self._normalize:
+            stored = self._unit_vector(stored)
+
+        if self._matrix is None:
+            self._matrix = np.empty((INITIAL_CAPACITY, self._vector_dim), dtype=self._dtype)
+        elif self._count == len(self._matrix):
+            grown = np.empty((2 * len(self._matrix), self._vector_dim), dtype=self._dtype)
+            grown[: self._count] = self._matrix[: self._count]
+            self._matrix = grown
+
+        self._matrix[self._count] = self._quantize(stored)
+        self._count += 1
         self.documents.append(document)
 
+    def _unit_vector(self, vec: np.ndarray) -> np.ndarray:
+        # Zero vectors are kept as they are
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+    def _quantize(self, vectors: np.ndarray) -> np.ndarray:
+        """Converts float32 vectors to the storage dtype; int8 expects unit-length input."""
+        if self._dtype == np.int8:
+            return np.round(vectors * INT8_SCALE).astype(np.int8)
+        return vectors.astype(self._dtype, copy=False)
+
     def _euclidean_distance(
         self, vec1: List[float], vec2: List[float]
     ) -> float:
@@ -109,34 +261,29 @@ class VectorIndex:
             raise ValueError("Vectors must have the same dimension")
         return math.sqrt(sum((p - q) ** 2 for p, q in zip(vec1, vec2)))
 
-    def _dot_product(self, vec1: List[float], vec2: List[float]) -> float:
-        if len(vec1) != len(vec2):
-            raise ValueError("Vectors must have the same dimension")
-        return sum(p * q for p, q in zip(vec1, vec2))
-
-    def _magnitude(self, vec: List[float]) -> float:
-        return math.sqrt(sum(x * x for x in vec))
+    def _cosine_distance(self, vec1, vec2) -> float:
+        a = np.asarray(vec1, dtype=np.float32)
+        b = np.asarray(vec2, dtype=np.float32)
 
-    def _cosine_distance(self, vec1: List[float], vec2: List[float]) -> float:
-        if len(vec1) != len(vec2):
-            raise ValueError("Vectors must have the same dimension")
+        if simsimd is not None:
+            if not a.any() or not b.any():
+                return 0.0 if not a.any() and not b.any() else 1.0
+            # Runtime-dispatched SIMD kernel, already bounded to [0, 2]
+            return float(simsimd.cosine(a, b))
 
-        mag1 = self._magnitude(vec1)
-        mag2 = self._magnitude(vec2)
+        # One fused dot per term and a single sqrt for both magnitudes
+        dot_prod = np.vdot(a, b)
+        denom = np.sqrt(np.vdot(a, a) * np.vdot(b, b))
 
-        if mag1 == 0 and mag2 == 0:
-            return 0.0
-        elif mag1 == 0 or mag2 == 0:
-            return 1.0
+        if denom == 0:
+            return 0.0 if not a.any() and not b.any() else 1.0
 
-        dot_prod = self._dot_product(vec1, vec2)
-        cosine_similarity = dot_prod / (mag1 * mag2)
-        cosine_similarity = max(-1.0, min(1.0, cosine_similarity))
+        cosine_similarity = max(-1.0, min(1.0, float(dot_prod / denom)))
 
         return 1.0 - cosine_similarity
 
     def __len__(self) -> int:
-        return len(self.vectors)
+        return self._count
 
     def __repr__(self) -> str:
         has_embed_fn = "Yes" if self._embedding_fn else "No"
@@ -1,14 +1,23 @@
-from chat_template import chat, add_user_message, text_from_message
+import asyncio
+from chat_template.chat_functions import chat, achat, add_user_message, text_from_message
 
-# Add context to a single chunk
-def add_context(text_chunk, source_text):
-    prompt = f"""
+model = "claude-sonnet-4-0"
+
+# Concurrent add_context calls in add_contexts (bounded for the API rate limit)
+MAX_CONCURRENCY = 10
+
+# The prompt is split at a cache breakpoint (cache_control ephemeral, ~5 minutes):
+# the instructions and the part of the document shared by every chunk come first and are cached,
+# so each chunk of the same document reuses them; the rest of the document and the chunk follow
+_DOCUMENT_PROMPT = """
     Write a short and succinct snippet of text to situate this chunk within the 
     overall source document for the purposes of improving search retrieval of the chunk. 
 
     Here is the original source document:
     <document> 
-    {source_text}
+    {shared_text}"""
+
+_CHUNK_PROMPT = """{source_text}
     </document> 
 
     Here is the chunk we want to situate within the whole document:
@@ -19,10 +28,56 @@ def add_context(text_chunk, source_text):
     Answer only with the succinct context and nothing else. 
     """
 
+def _context_prompt(text_chunk, source_text, shared_context):
+    if not shared_context:
+        # The whole source document is the shared part
+        shared_context, source_text = source_text, ""
+    elif source_text:
+        source_text = "\n" + source_text
+    return [
+        {
+            "type": "text",
+            "text": _DOCUMENT_PROMPT.format(shared_text=shared_context),
+            "cache_control": {"type": "ephemeral"},
+        },
+        {"type": "text", "text": _CHUNK_PROMPT.format(source_text=source_text, text_chunk=text_chunk)},
+    ]
+
+# Add context to a single chunk
+# shared_context: leading part of the document that is the same for every chunk (e.g. its first chunks),
+# sent before source_text; when empty, source_text itself is the shared part
+def add_context(text_chunk, source_text, shared_context="", client=None):
     messages = []
 
-    add_user_message(messages, prompt)
-    result = chat(messages)
+    add_user_message(messages, _context_prompt(text_chunk, source_text, shared_context))
+    result = chat(model, client, messages)
 
     # Note: updated to use 'text_from_message' helper fn
-    return text_from_message(result) + "\n" + text_chunk
\ No newline at end of file
+    return text_from_message(result) + "\n" + text_chunk
+
+# Async variant of add_context, client must be an AsyncAnthropic instance (None: shared client)
+async def aadd_context(text_chunk, source_text, shared_context="", client=None):
+    messages = []
+
+    add_user_message(messages, _context_prompt(text_chunk, source_text, shared_context))
+    result = await achat(model, client, messages)
+
+    return text_from_message(result) + "\n" + text_chunk
+
+# Contextualize many chunks of one document concurrently, results in input order.
+# items: (text_chunk, source_text) pairs. The first call runs alone so the shared prefix
+# is cached before the others fan out, at most max_concurrency at a time
+# client=None uses the pooled client of the running event loop, so repeated asyncio.run(add_contexts(...))
+# calls each get a pool bound to their own loop
+async def add_contexts(items, shared_context="", max_concurrency=MAX_CONCURRENCY, client=None):
+    if not items:
+        return []
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def bounded(text_chunk, source_text):
+        async with semaphore:
+            return await aadd_context(text_chunk, source_text, shared_context, client)
+
+    first = await bounded(*items[0])
+    rest = await asyncio.gather(*(bounded(*item) for item in items[1:]))
+    return [first, *rest]
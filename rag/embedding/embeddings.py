@@ -1,7 +1,35 @@
+import functools
+import hashlib
+import numpy as np
+from diskcache import Cache
 from sentence_transformers import SentenceTransformer
 
+MODEL_ID = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+
 # Load the model once
-model = SentenceTransformer("sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+model = SentenceTransformer(MODEL_ID)
+
+# Embedding cache: in memory for the process lifetime, on disk across runs.
+# Keyed by model and content, values are float16 bytes (half the size of float32)
+EMBEDDING_CACHE_DIR = ".embedding_cache"
+EMBEDDING_LRU_SIZE = 4096
+
+@functools.lru_cache(maxsize=1)
+def _embedding_cache():
+    return Cache(EMBEDDING_CACHE_DIR)
+
+def _embedding_cache_key(text: str) -> str:
+    return hashlib.sha256(f"{MODEL_ID}\n{text}".encode("utf-8")).hexdigest()
+
+@functools.lru_cache(maxsize=EMBEDDING_LRU_SIZE)
+def _cached_embedding(text: str) -> bytes:
+    cache = _embedding_cache()
+    key = _embedding_cache_key(text)
+    data = cache.get(key)
+    if data is None:
+        data = model.encode(text, normalize_embeddings=True).astype(np.float16).tobytes()
+        cache.set(key, data)
+    return data
 
 # Embedding function
 def generate_embedding(text: str) -> list[float]:
@@ -11,5 +39,21 @@ def generate_embedding(text: str) -> list[float]:
     FAISS: index.add(np.array([embedding]))
     Qdrant: vectors=[embedding]
     ChromaDB: documents=[text], embeddings=[embedding]
+    Testi già visti non vengono ricalcolati (cache in memoria + su disco).
     '''
-    return model.encode(text, normalize_embeddings=True).tolist() # compatibile con FAISS, Qdrant, ecc.
\ No newline at end of file
+    # New list on every call: callers may mutate it without touching the cached value
+    return np.frombuffer(_cached_embedding(text), dtype=np.float16).astype(np.float32).tolist() # compatibile con FAISS, Qdrant, ecc.
+
+# Batch embedding function: a single model.encode call for every text not cached yet
+def generate_embeddings(texts: list[str], batch_size: int = 64) -> list[list[float]]:
+    cache = _embedding_cache()
+    missing = list({
+        text: None for text in texts if _embedding_cache_key(text) not in cache
+    })
+    if missing:
+        vectors = model.encode(
+            missing, batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True
+        ).astype(np.float16)
+        for text, vector in zip(missing, vectors):
+            cache.set(_embedding_cache_key(text), vector.tobytes())
+    return [generate_embedding(text) for text in texts]
@@ -1,9 +1,30 @@
 # Retriever implementation
 
 import random, string, json
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, List, Dict, Tuple, Protocol, Optional, Callable
 
+import numpy as np
+
 from chat_template.chat_functions import chat, add_user_message, add_assistant_message, text_from_message
+from rag.retriver.semantic_cache import SemanticCache
+
+model = "claude-sonnet-4-0"
+
+# Static instructions, identical on every call, sent ahead of the variable part.
+# No cache_control breakpoint: at ~110 tokens the block is far below the minimum cacheable
+# prefix (1024 tokens on Sonnet / Opus), so the API would ignore it
+_RERANK_INSTRUCTIONS = """
+    You are about to be given a set of documents, along with an id of each.
+    Your task is to select and sort the most relevant documents to answer the user's question.
+
+    Respond in the following format:
+    ```json
+    {
+        "document_ids": str[] # List document ids, sorted in order of decreasing relevance to the user's query. The most relevant documents should be listed first.
+    }
+    ```
+    """
 
 # Reranker function
 def reranker_fn(docs, query_text, k):
@@ -20,8 +41,7 @@ def reranker_fn(docs, query_text, k):
     )
 
     prompt = f"""
-    You are about to be given a set of documents, along with an id of each.
-    Your task is to select and sort the {k} most relevant documents to answer the user's question.
+    Select exactly {k} documents: "document_ids" must be {k} elements long.
 
     Here is the user's question:
     <question>
@@ -32,20 +52,16 @@ def reranker_fn(docs, query_text, k):
     <documents>
     {joined_docs}
     </documents>
-
-    Respond in the following format:
-    ```json
-    {{
-        "document_ids": str[] # List document ids, {k} elements long, sorted in order of decreasing relevance to the user's query. The most relevant documents should be listed first.
-    }}
-    ```
     """
 
     messages = []
-    add_user_message(messages, prompt)
+    add_user_message(messages, [
+        {"type": "text", "text": _RERANK_INSTRUCTIONS},
+        {"type": "text", "text": prompt},
+    ])
     add_assistant_message(messages, "```json")
 
-    result = chat(messages, stop_sequences=["```"])
+    result = chat(model, None, messages, stop_sequences=["```"])
 
     # Note: updated to use 'text_from_message' helper fn
     return json.loads(text_from_message(result))["document_ids"]
@@ -55,8 +71,10 @@ def reranker_fn(docs, query_text, k):
 class SearchIndex(Protocol):
     def add_document(self, document: Dict[str, Any]) -> None: ...
     def add_documents(self, documents: List[Dict[str, Any]]) -> None: ...
+    # query_embedding: the query already embedded by the Retriever, indexes that do not use
+    # embeddings ignore it
     def search(
-        self, query: Any, k: int = 1
+        self, query: Any, k: int = 1, query_embedding: Optional[List[float]] = None
     ) -> List[Tuple[Dict[str, Any], float]]: ...
 
 
@@ -68,25 +86,84 @@ class Retriever:
         reranker_fn: Optional[
             Callable[[List[Dict[str, Any]], str, int], List[str]]
         ] = reranker_fn,
+        embedding_fn: Optional[Callable[[str], List[float]]] = None,
+        semantic_cache: Optional[SemanticCache] = None,
     ):
         if len(indexes) == 0:
             raise ValueError("At least one index must be provided")
+        if semantic_cache is not None and embedding_fn is None:
+            raise ValueError("A semantic cache needs an embedding_fn for the queries")
         self._indexes = list(indexes)
         self._reranker_fn = reranker_fn
-
-    def add_document(self, document: Dict[str, Any]):
-        if "id" not in document:
-            document["id"] = "".join(
+        self._embedding_fn = embedding_fn
+        # Results of near-duplicate queries are served from here, cleared when documents change
+        self._semantic_cache = semantic_cache
+        # Indexes are searched concurrently (NumPy, FAISS and HTTP calls release the GIL)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Ids generated by _ensure_id, so two documents never draw the same one
+        self._random_ids = set()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=len(self._indexes), thread_name_prefix="retriever"
+            )
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _ensure_id(self, document: Dict[str, Any]):
+        # Every document carries a unique "id" before reaching the indexes: fusion and reranking key on it
+        if "id" in document:
+            return
+        doc_id = None
+        while doc_id is None or doc_id in self._random_ids:
+            doc_id = "".join(
                 random.choices(string.ascii_letters + string.digits, k=4)
             )
+        self._random_ids.add(doc_id)
+        document["id"] = doc_id
 
-        for index in self._indexes:
-            index.add_document(document)
+    def _shared_tokenizer(self) -> Optional[Callable[[str], List[str]]]:
+        # The tokenizer of the lexical indexes, when they all use the same one
+        tokenizers = {
+            index._tokenizer for index in self._indexes if hasattr(index, "_tokenizer")
+        }
+        return tokenizers.pop() if len(tokenizers) == 1 else None
+
+    def add_document(self, document: Dict[str, Any]):
+        self.add_documents([document])
 
     # Added the 'add_documents' method to avoid rate limiting errors from VoyageAI
     def add_documents(self, documents: List[Dict[str, Any]]):
-        for index in self._indexes:
-            index.add_documents(documents)
+        for document in documents:
+            self._ensure_id(document)
+
+        # Each document is tokenized once for all lexical indexes, passed down as "_tokens"
+        tokenizer = self._shared_tokenizer()
+        if tokenizer is not None:
+            for document in documents:
+                document["_tokens"] = tokenizer(document["content"])
+
+        try:
+            for index in self._indexes:
+                index.add_documents(documents)
+        finally:
+            if tokenizer is not None:
+                for document in documents:
+                    document.pop("_tokens", None)
+
+        if self._semantic_cache is not None:
+            self._semantic_cache.clear()
 
     def search(
         self, query_text: str, k: int = 1, k_rrf: int = 60
@@ -98,59 +175,65 @@ class Retriever:
         if k_rrf < 0:
             raise ValueError("k_rrf must be non-negative.")
 
-        all_results = [
-            index.search(query_text, k=k * 5) for index in self._indexes
-        ]
-
-        doc_ranks = {}
+        # The query is embedded once, for the semantic cache and every index
+        query_embedding = None
+        if self._embedding_fn is not None:
+            query_embedding = self._embedding_fn(query_text)
+
+        if self._semantic_cache is not None:
+            cached = self._semantic_cache.get(query_embedding, key=(k, k_rrf))
+            if cached is not None:
+                return list(cached)
+
+        def search_index(index):
+            if query_embedding is None:
+                return index.search(query_text, k=k * 5)
+            return index.search(query_text, k=k * 5, query_embedding=query_embedding)
+
+        if len(self._indexes) == 1:
+            all_results = [search_index(self._indexes[0])]
+        else:
+            all_results = list(self._get_executor().map(search_index, self._indexes))
+
+        # Fusion keyed on the stable document id: indexes may return copies of the same document
+        doc_rows: Dict[Any, int] = {}
+        docs: List[Dict[str, Any]] = []
+        positions = []
         for idx, results in enumerate(all_results):
             for rank, (doc, _) in enumerate(results):
-                doc_id = id(doc)
-                if doc_id not in doc_ranks:
-                    doc_ranks[doc_id] = {
-                        "doc_obj": doc,
-                        "ranks": [float("inf")] * len(self._indexes),
-                    }
-                doc_ranks[doc_id]["ranks"][idx] = rank + 1
-
-        def calc_rrf_score(ranks: List[float]) -> float:
-            return sum(1.0 / (k_rrf + r) for r in ranks if r != float("inf"))
-
-        scored_docs: List[Tuple[Dict[str, Any], float]] = [
-            (ranks["doc_obj"], calc_rrf_score(ranks["ranks"]))
-            for ranks in doc_ranks.values()
-        ]
-
-        filtered_docs = [
-            (doc, score) for doc, score in scored_docs if score > 0
-        ]
-        filtered_docs.sort(key=lambda x: x[1], reverse=True)
-
-        result = filtered_docs[:k]
+                row = doc_rows.get(doc["id"])
+                if row is None:
+                    row = doc_rows[doc["id"]] = len(docs)
+                    docs.append(doc)
+                positions.append((row, idx, rank + 1))
+
+        if not docs:
+            result = []
+        else:
+            # (documents, indexes) ranks, inf where an index did not return the document
+            ranks = np.full((len(docs), len(self._indexes)), np.inf)
+            rows, cols, values = zip(*positions)
+            ranks[rows, cols] = values
+            scores = np.sum(1.0 / (k_rrf + ranks), axis=1, where=np.isfinite(ranks))
+
+            order = np.argsort(-scores, kind="stable")
+            order = order[scores[order] > 0][:k]
+            result = [(docs[i], float(scores[i])) for i in order]
 
         if self._reranker_fn is not None:
             docs_only = [doc for doc, _ in result]
 
-            for doc in docs_only:
-                if "id" not in doc:
-                    doc["id"] = "".join(
-                        random.choices(
-                            string.ascii_letters + string.digits, k=4
-                        )
-                    )
-
             doc_lookup = {doc["id"]: doc for doc in docs_only}
             reranked_ids = self._reranker_fn(docs_only, query_text, k)
 
-            new_result = []
-            original_scores = {id(doc): score for doc, score in result}
-
-            for doc_id in reranked_ids:
-                if doc_id in doc_lookup:
-                    doc = doc_lookup[doc_id]
-                    score = original_scores.get(id(doc), 0.0)
-                    new_result.append((doc, score))
+            original_scores = {doc["id"]: score for doc, score in result}
+            result = [
+                (doc_lookup[doc_id], original_scores[doc_id])
+                for doc_id in reranked_ids
+                if doc_id in doc_lookup
+            ]
 
-            result = new_result
+        if self._semantic_cache is not None:
+            self._semantic_cache.put(query_embedding, list(result), key=(k, k_rrf))
 
         return result
@@ -0,0 +1,106 @@
+# Semantic cache for retrieval results
+
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+
+class SemanticCache:
+    '''
+    In-memory cache of retrieval results keyed by query embedding.
+    Exact lookup: the query is compared with every cached unit embedding in one matmul, and a hit
+    needs the same key (k, k_rrf, ...) and cosine similarity >= threshold with a cached query
+    (the most similar one wins). For the default max_entries this is a single small GEMV.
+    Least recently used entries are evicted beyond max_entries.
+    '''
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        max_entries: int = 1024,
+    ):
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError("threshold must be in (0, 1].")
+        if max_entries <= 0:
+            raise ValueError("max_entries must be a positive integer.")
+        self.threshold = threshold
+        self._max_entries = max_entries
+        # (max_entries, dim) unit embeddings, allocated on the first embedding once the dimension is known.
+        # Row i belongs to the entry stored in slot i, free rows are never matched
+        self._units: Optional[np.ndarray] = None
+        self._used = np.zeros(max_entries, dtype=bool)
+        self._slot_keys: List[Hashable] = [None] * max_entries
+
+        # slot -> results, in LRU order
+        self._entries: "OrderedDict[int, Any]" = OrderedDict()
+        self._free: List[int] = list(range(max_entries - 1, -1, -1))
+
+        self.hits = 0
+        self.misses = 0
+
+    def _unit(self, embedding) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+    def _best_match(self, unit: np.ndarray, key: Hashable) -> Tuple[int, float]:
+        if self._units is None or not self._entries:
+            return -1, 0.0
+        similarities = self._units @ unit
+        similarities[~self._used] = -np.inf
+        # Slots whose similarity reaches the threshold, most similar first; the key check is done on those only
+        candidates = np.flatnonzero(similarities >= self.threshold)
+        for slot in candidates[np.argsort(-similarities[candidates], kind="stable")]:
+            if self._slot_keys[slot] == key:
+                return int(slot), float(similarities[slot])
+        return -1, 0.0
+
+    def get(self, embedding, key: Hashable = None) -> Optional[Any]:
+        slot, _ = self._best_match(self._unit(embedding), key)
+        if slot < 0:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(slot)
+        self.hits += 1
+        return self._entries[slot]
+
+    def put(self, embedding, results: Any, key: Hashable = None):
+        unit = self._unit(embedding)
+        if self._units is None:
+            self._units = np.zeros((self._max_entries, unit.shape[0]), dtype=np.float32)
+
+        if not self._free:
+            old_slot, _ = self._entries.popitem(last=False)
+            self._release(old_slot)
+        slot = self._free.pop()
+        self._units[slot] = unit
+        self._used[slot] = True
+        self._slot_keys[slot] = key
+        self._entries[slot] = results
+
+    def _release(self, slot: int):
+        self._used[slot] = False
+        self._slot_keys[slot] = None
+        self._free.append(slot)
+
+    def clear(self):
+        for slot in list(self._entries):
+            self._release(slot)
+        self._entries.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @property
+    def miss_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.misses / total if total else 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return f"SemanticCache(count={len(self)}, threshold={self.threshold}, hit_rate={self.hit_rate:.2f})"
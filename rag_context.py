@@ -1,41 +1,41 @@
+import asyncio
 from rag.chunking_strategies.basic_chunking import chunk_by_section
-from rag.embedding.embeddings import generate_embedding
+from rag.embedding.embeddings import generate_embedding, generate_embeddings
 from rag.VectorDB.BM25Index import BM25Index
 from rag.VectorDB.VectorIndex import VectorIndex
 from rag.retriver.MultipleIndex import Retriever
 from rag.retriver.MultipleIndex import reranker_fn
 
-from rag.context.context import add_context
+from rag.context.context import add_contexts
 
 text= "Your long document text goes here..."
 chunks = chunk_by_section(text)
 
 # Create a vector index, a bm25 index, then use them to create a Retriever
-vector_index = VectorIndex(embedding_fn=generate_embedding)
+vector_index = VectorIndex(embedding_fn=generate_embedding, embedding_fn_batch=generate_embeddings)
 bm25_index = BM25Index()
 
 # Join the two indexes in a retriever
-retriever = Retriever(bm25_index, vector_index, reranker_fn= reranker_fn)
+retriever = Retriever(bm25_index, vector_index, reranker_fn= reranker_fn, embedding_fn=generate_embedding)
 
 
 # Add context to each chunk, then add to the retriever
 num_start_chunks = 2
 num_prev_chunks = 2
-contextualized_chunks = []
 
-for i, chunk in enumerate(chunks):
-    context_parts = []
-
-    # Initial set of chunks from the start of the doc
-    context_parts.extend(chunks[: min(num_start_chunks, len(chunks))])
+# Initial set of chunks from the start of the doc: the same for every chunk, so it is the
+# cached prompt prefix. Chunks are processed concurrently, well within the cache lifetime
+start_context = "\n".join(chunks[: min(num_start_chunks, len(chunks))])
 
+items = []
+for i, chunk in enumerate(chunks):
     # Additional chunks ahead of the current chunk we're contextualizing
     start_idx = max(0, i - num_prev_chunks)
-    context_parts.extend(chunks[start_idx:i])
+    context = "\n".join(chunks[start_idx:i])
 
-    context = "\n".join(context_parts)
+    items.append((chunk, context))
 
-    contextualized_chunks.append(add_context(chunk, context))
+contextualized_chunks = asyncio.run(add_contexts(items, shared_context=start_context))
 
 retriever.add_documents([{"content": chunk} for chunk in contextualized_chunks])
 
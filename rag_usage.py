@@ -1,6 +1,6 @@
 
 from rag.chunking_strategies.basic_chunking import chunk_by_section
-from rag.embedding.embeddings import generate_embedding
+from rag.embedding.embeddings import generate_embedding, generate_embeddings
 from rag.VectorDB.BM25Index import BM25Index
 from rag.VectorDB.VectorIndex import VectorIndex
 from rag.retriver.MultipleIndex import Retriever
@@ -10,7 +10,7 @@ text= "Your long document text goes here..."
 chunks = chunk_by_section(text)
 
 # Create a vector index, a bm25 index, then use them to create a Retriever
-vector_index = VectorIndex(embedding_fn=generate_embedding)
+vector_index = VectorIndex(embedding_fn=generate_embedding, embedding_fn_batch=generate_embeddings)
 bm25_index = BM25Index()
 
 # Join the two indexes in a retriever
@@ -1,8 +1,56 @@
 import shutil
 import os
-from typing import Optional, List
+import bisect
+import codecs
+import itertools
+import mmap
+import tempfile
+import functools
+from typing import Iterator, Optional, List
 
 # Text edit schema per i 3 modelli stato dell'arte di Anthropic
+# Tabella (prefissi del modello, schema), in ordine di verifica. Gli schemi sono
+# condivisi tra le chiamate: trattarli come costanti
+_TEXT_EDIT_SCHEMAS = (
+    # Claude 4 family (Opus & Sonnet) - rilasciato 29 aprile 2025
+    # NOTA: Non include il comando undo_edit
+    (("claude-opus-4", "claude-sonnet-4"), {
+        "type": "text_editor_20250429",
+        "name": "str_replace_based_edit_tool",  # Nome aggiornato dalla docs
+    }),
+    # Claude 3.7 Sonnet - rilasciato 24 gennaio 2025
+    # Include tutti i comandi compreso undo_edit
+    (("claude-3-7-sonnet",), {
+        "type": "text_editor_20250124",
+        "name": "str_replace_based_edit_tool",
+    }),
+    # Claude 3.5 Sonnet - rilasciato 22 ottobre 2024
+    # Include tutti i comandi compreso undo_edit
+    (("claude-3-5-sonnet",), {
+        "type": "text_editor_20241022",
+        "name": "str_replace_based_edit_tool",
+    }),
+)
+
+# Prefisso -> schema, un solo str.startswith(tuple) per chiamata
+_SCHEMA_BY_PREFIX = {
+    prefix: schema for prefixes, schema in _TEXT_EDIT_SCHEMAS for prefix in prefixes
+}
+_SCHEMA_PREFIXES = tuple(_SCHEMA_BY_PREFIX)
+
+_SUPPORTED_MODELS = ", ".join(
+    f"{prefix}-* ({schema['type']})" for prefix, schema in _SCHEMA_BY_PREFIX.items()
+)
+
+# Funzione pura del nome modello: lo schema viene risolto una sola volta per modello
+
+@functools.lru_cache(maxsize=32)
+def _schema_for(model):
+    if model.startswith(_SCHEMA_PREFIXES):
+        return next(
+            schema for prefix, schema in _SCHEMA_BY_PREFIX.items() if model.startswith(prefix)
+        )
+    return None
 
 def get_text_edit_schema(model):
     """
@@ -17,48 +65,82 @@ def get_text_edit_schema(model):
         model (str): Nome del modello Claude
         
     Returns:
-        dict: Schema del text editor tool
+        dict: Schema del text editor tool (copia nuova, modificabile dal chiamante)
         
     Raises:
         ValueError: Se il modello non è supportato
     """
+    schema = _schema_for(model)
+    if schema is not None:
+        # Copia: chi aggiunge campi (es. cache_control) non altera le chiamate successive
+        return dict(schema)
+
+    raise ValueError(
+        f"Modello non supportato: {model}. "
+        f"Modelli supportati: {_SUPPORTED_MODELS}. "
+        f"Vedi: https://docs.anthropic.com/en/docs/agents-and-tools/tool-use/text-editor-tool"
+    )
+
+
+# Risoluzione dei percorsi: nessuna cache, il controllo di sicurezza vede sempre lo stato
+# attuale del disco (un symlink creato da altri dopo una prima risoluzione non lo aggira)
+
+def _resolve(base_real: str, base_real_sep: str, file_path: str) -> Optional[str]:
+    """Percorso reale di file_path relativo a base_real, o None se esce dalla directory di base."""
+    abs_path = os.path.realpath(os.path.join(base_real, file_path))
+    if abs_path != base_real and not abs_path.startswith(base_real_sep):
+        return None
+    return abs_path
+
+
+# Blocco di copia quando sendfile non è disponibile (1 MiB: meno syscall rispetto al default)
+COPY_BUFSIZE = 1024 * 1024
+
+
+def _is_plain_utf8(m) -> bool:
+    """
+    True se i byte (es. un mmap) sono UTF-8 valido senza '\r': solo allora le
+    modifiche sui byte coincidono con quelle del percorso testuale. Verificato a
+    blocchi di COPY_BUFSIZE, senza decodificare tutto il file in una volta.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        for start in range(0, len(m), COPY_BUFSIZE):
+            block = m[start:start + COPY_BUFSIZE]
+            if b"\r" in block:
+                return False
+            decoder.decode(block)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+# Budget di default di view_iter: l'output resta entro il contesto del modello
+VIEW_MAX_BYTES = 200_000
+
+
+def _translate_errors(permission_message: str, decode_message: Optional[str] = None):
+    """
+    Decoratore che converte gli errori di un'operazione del tool nei messaggi mostrati all'utente.
     
-    # Claude 4 family (Opus & Sonnet) - rilasciato 29 aprile 2025
-    # NOTA: Non include il comando undo_edit
-    if model.startswith("claude-opus-4") or model.startswith("claude-sonnet-4"):
-        return {
-            "type": "text_editor_20250429",
-            "name": "str_replace_based_edit_tool",  # Nome aggiornato dalla docs
-        }
-    
-    # Claude 3.7 Sonnet - rilasciato 24 gennaio 2025
-    # Include tutti i comandi compreso undo_edit
-    elif model.startswith("claude-3-7-sonnet"):
-        return {
-            "type": "text_editor_20250124",
-            "name": "str_replace_based_edit_tool",
-        }
-    
-    # Claude 3.5 Sonnet - rilasciato 22 ottobre 2024  
-    # Include tutti i comandi compreso undo_edit
-    elif model.startswith("claude-3-5-sonnet"):
-        return {
-            "type": "text_editor_20241022", 
-            "name": "str_replace_based_edit_tool",
-        }
-    
-    else:
-        supported_models = [
-            "claude-opus-4-* (text_editor_20250429)",
-            "claude-sonnet-4-* (text_editor_20250429)", 
-            "claude-3-7-sonnet-* (text_editor_20250124)",
-            "claude-3-5-sonnet-* (text_editor_20241022)"
-        ]
-        raise ValueError(
-            f"Modello non supportato: {model}. "
-            f"Modelli supportati: {', '.join(supported_models)}. "
-            f"Vedi: https://docs.anthropic.com/en/docs/agents-and-tools/tool-use/text-editor-tool"
-        )
+    PermissionError diventa PermissionError(permission_message). UnicodeDecodeError
+    diventa un UnicodeDecodeError con decode_message, se fornito, altrimenti un
+    ValueError con lo stesso testo. Tutte le altre eccezioni (ValueError,
+    FileNotFoundError, IndexError, ...) passano invariate, traceback incluso.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            try:
+                return method(*args, **kwargs)
+            except PermissionError:
+                raise PermissionError(permission_message) from None
+            except UnicodeDecodeError as e:
+                if decode_message is None:
+                    raise ValueError(str(e)) from None
+                raise UnicodeDecodeError("utf-8", b"", 0, 1, decode_message) from None
+        return wrapper
+    return decorator
 
 
 # TOOL CLASS
@@ -89,6 +171,29 @@ class TextEditorTool:
         self.base_dir = base_dir or os.getcwd()
         self.backup_dir = backup_dir or os.path.join(self.base_dir, ".backups")
         os.makedirs(self.backup_dir, exist_ok=True)
+        # Directory di base risolta una sola volta (symlink inclusi) per _validate_path
+        self._base_real = os.path.realpath(self.base_dir)
+        # Prefisso con separatore finale ('/' resta '/'): basta startswith per il confronto
+        self._base_real_sep = os.path.join(self._base_real, "")
+        # Indice dei backup: nome file -> percorsi dei backup, ordinati per timestamp crescente.
+        # Popolato con una sola scansione della directory, poi aggiornato da _backup_file
+        self._backups: dict[str, list[str]] = {}
+        with os.scandir(self.backup_dir) as entries:
+            for entry in entries:
+                self._index_backup(entry.path)
+
+    @staticmethod
+    def _backup_timestamp(backup_path: str) -> int:
+        return int(backup_path.rsplit(".", 1)[1])
+
+    def _index_backup(self, backup_path: str):
+        """Aggiunge un backup '<nome file>.<timestamp>' all'indice in memoria."""
+        file_name, _, suffix = os.path.basename(backup_path).rpartition(".")
+        if not file_name or not suffix.isdigit():
+            return
+        backups = self._backups.setdefault(file_name, [])
+        if backup_path not in backups:
+            bisect.insort(backups, backup_path, key=self._backup_timestamp)
 
     def _validate_path(self, file_path: str) -> str:
         """
@@ -101,15 +206,20 @@ class TextEditorTool:
         Args:
             file_path (str): Il percorso del file da validare.
             
+        Il confronto avviene sui percorsi reali, contro il prefisso della directory
+        di base con separatore finale, quindi né un prefisso simile ('/base'
+        contro '/base_evil') né un symlink che punta fuori dalla directory di base
+        sono accettati.
+        
         Returns:
-            str: Il percorso assoluto e normalizzato del file.
+            str: Il percorso assoluto e reale (symlink risolti) del file.
             
         Raises:
             ValueError: Se il percorso del file si trova al di fuori della
                         directory di base consentita.
         """
-        abs_path = os.path.normpath(os.path.join(self.base_dir, file_path))
-        if not abs_path.startswith(self.base_dir):
+        abs_path = _resolve(self._base_real, self._base_real_sep, file_path)
+        if abs_path is None:
             raise ValueError(
                 f"Access denied: Path '{file_path}' is outside the allowed directory"
             )
@@ -129,21 +239,120 @@ class TextEditorTool:
             str: Il percorso del file di backup creato, o una stringa vuota
                  se il file originale non esiste.
         """
-        if not os.path.exists(file_path):
+        try:
+            mtime = os.stat(file_path).st_mtime
+        except FileNotFoundError:
             return ""
         file_name = os.path.basename(file_path)
-        backup_path = os.path.join(
-            self.backup_dir, f"{file_name}.{os.path.getmtime(file_path):.0f}"
-        )
-        shutil.copy2(file_path, backup_path)
+        backup_path = os.path.join(self.backup_dir, f"{file_name}.{mtime:.0f}")
+        try:
+            # Hardlink: nessuna copia dei contenuti. Il backup resta immutabile
+            # perché le modifiche sostituiscono il file (_write_file) invece di riscriverlo
+            if os.path.lexists(backup_path):
+                os.remove(backup_path)
+            os.link(file_path, backup_path)
+        except OSError:
+            # Filesystem diversi, link non supportati o non permessi: copia dei contenuti
+            self._copy_file(file_path, backup_path)
+        self._index_backup(backup_path)
         return backup_path
 
+    def _copy_file(self, src: str, dst: str, sync: bool = False) -> None:
+        """
+        Copia contenuto e metadati (come shutil.copy2) di src in dst.
+        
+        Su Linux usa os.sendfile (copia nel kernel, senza buffer in user space);
+        altrimenti, o se sendfile non è supportato dal filesystem, copia a
+        blocchi di COPY_BUFSIZE byte. Con sync=True il contenuto di dst viene
+        portato su disco (fsync) prima della chiusura.
+        """
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            self._copy_range(fsrc, fdst, 0, os.fstat(fsrc.fileno()).st_size)
+            if sync:
+                fdst.flush()
+                os.fsync(fdst.fileno())
+        shutil.copystat(src, dst)
+
+    @staticmethod
+    def _copy_range(fsrc, fdst, offset: int, count: int) -> None:
+        """
+        Accoda a fdst (aperto in 'wb') count byte di fsrc (aperto in 'rb') a partire da offset.
+        
+        Usa os.sendfile dove disponibile, altrimenti (o se il filesystem lo rifiuta)
+        completa la copia a blocchi di COPY_BUFSIZE byte.
+        """
+        fdst.flush()
+        end = offset + count
+        if hasattr(os, "sendfile"):
+            try:
+                while offset < end:
+                    sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, end - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+            except OSError:
+                pass
+        fsrc.seek(offset)
+        while offset < end:
+            block = fsrc.read(min(COPY_BUFSIZE, end - offset))
+            if not block:
+                break
+            fdst.write(block)
+            offset += len(block)
+
+    def _temp_path(self, file_path: str) -> str:
+        """Crea un file temporaneo vuoto nella stessa directory di file_path (per os.replace)."""
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(file_path), prefix=f".{os.path.basename(file_path)}.", suffix=".tmp"
+        )
+        os.close(fd)
+        return tmp_path
+
+    @staticmethod
+    def _write_all(fd: int, data: bytes) -> None:
+        """Scrive tutti i byte di data sul file descriptor, gestendo le scritture parziali."""
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+
+    def _write_file(self, file_path: str, chunks) -> None:
+        """
+        Sostituisce il contenuto di un file esistente scrivendo un file temporaneo
+        e rinominandolo con os.replace.
+        
+        Il file originale (e quindi un suo eventuale backup hardlinked) non viene
+        mai riscritto: il nuovo contenuto ha un nuovo inode, che mantiene i
+        permessi dell'originale. Il contenuto è codificato in UTF-8 una sola
+        volta e scritto direttamente sul file descriptor, senza TextIOWrapper,
+        e portato su disco (fsync) prima di os.replace: dopo un crash il file
+        contiene la versione precedente o quella nuova, mai una scrittura parziale.
+        
+        Args:
+            file_path (str): Il percorso assoluto del file da sostituire.
+            chunks (Iterable[str]): Il nuovo contenuto, scritto in ordine.
+        """
+        tmp_path = self._temp_path(file_path)
+        try:
+            data = "".join(chunks).encode("utf-8")
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_TRUNC)
+            try:
+                self._write_all(fd, data)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            shutil.copymode(file_path, tmp_path)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
     def _restore_backup(self, file_path: str) -> str:
         """
         Ripristina l'ultima versione di backup di un file.
         
-        Cerca il file di backup più recente nella directory di backup e lo
-        ripristina, sovrascrivendo il file originale.
+        Prende il file di backup più recente dall'indice in memoria (senza
+        scansionare la directory di backup) e lo ripristina, sovrascrivendo
+        il file originale.
         
         Args:
             file_path (str): Il percorso assoluto del file da ripristinare.
@@ -155,39 +364,278 @@ class TextEditorTool:
             FileNotFoundError: Se non viene trovato alcun file di backup
                                per il percorso specificato.
         """
-        file_name = os.path.basename(file_path)
-        backups = [
-            f
-            for f in os.listdir(self.backup_dir)
-            if f.startswith(file_name + ".")
-        ]
+        backups = self._backups.get(os.path.basename(file_path))
         if not backups:
             raise FileNotFoundError(f"No backups found for {file_path}")
 
-        latest_backup = sorted(backups, reverse=True)[0]
-        backup_path = os.path.join(self.backup_dir, latest_backup)
+        backup_path = backups[-1]
 
-        shutil.copy2(backup_path, file_path)
+        # Copia su un file temporaneo + os.replace: il file corrente può essere
+        # un hardlink dello stesso backup, che non deve essere riscritto
+        tmp_path = self._temp_path(file_path)
+        try:
+            self._copy_file(backup_path, tmp_path, sync=True)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
         return f"Successfully restored {file_path} from backup"
 
-    def _count_matches(self, content: str, old_str: str) -> int:
+    def _replace_unique_mapped(self, abs_path: str, old_str: str, new_str: str) -> bool:
+        """
+        Esegue str_replace direttamente sui byte del file, tramite mmap.
+        
+        Il file viene prima verificato per intero (_is_plain_utf8). Poi la prima
+        ricerca trova l'occorrenza e la seconda (dalla fine della prima) verifica
+        che sia unica; l'intero conteggio serve solo per il messaggio d'errore.
+        Il nuovo file è composto da _splice_file attorno a new_str.
+        
+        Returns:
+            bool: False se il file richiede il percorso testuale (file vuoto,
+                  old_str vuota, UTF-8 non valido, che il percorso testuale
+                  rifiuta con l'errore di decodifica, o caratteri '\r' che la
+                  lettura in modalità testo convertirebbe); in quel caso il
+                  file non viene toccato.
+            
+        Raises:
+            ValueError: Se non viene trovata alcuna corrispondenza o se ne
+                        vengono trovate più di una.
+        """
+        old = old_str.encode("utf-8")
+        with open(abs_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if not old or size == 0:
+                return False
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                if not _is_plain_utf8(m):
+                    return False
+                first = m.find(old)
+                if first == -1:
+                    raise ValueError(
+                        "No match found for replacement. Please check your text and try again."
+                    )
+                pos = m.find(old, first + len(old))
+                if pos != -1:
+                    match_count = 1
+                    while pos != -1:
+                        match_count += 1
+                        pos = m.find(old, pos + len(old))
+                    raise ValueError(
+                        f"Found {match_count} matches for replacement text. Please provide more context to make a unique match."
+                    )
+
+            self._splice_file(abs_path, f, size, first, first + len(old), new_str.encode("utf-8"))
+        return True
+
+    def _insert_mapped(self, abs_path: str, insert_line: int, new_str: str) -> bool:
         """
-        Conta il numero di occorrenze di una sottostringa all'interno di una stringa.
+        Esegue insert direttamente sui byte del file, tramite mmap.
+        
+        Il punto di inserimento è trovato cercando il newline numero `insert_line`;
+        il file viene poi ricomposto come in _replace_unique_mapped, senza
+        materializzare la lista delle righe. Il risultato è identico al percorso
+        testuale, incluso il newline aggiunto prima del testo se il file non
+        termina con '\n'.
+        
+        Returns:
+            bool: False se il file richiede il percorso testuale (file vuoto,
+                  riga negativa, UTF-8 non valido o caratteri '\r'); in quel
+                  caso il file non viene toccato.
+            
+        Raises:
+            IndexError: Se il numero di riga specificato è fuori dall'intervallo
+                        valido del file.
+        """
+        with open(abs_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0 or insert_line < 0:
+                return False
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                if not _is_plain_utf8(m):
+                    return False
+                ends_with_newline = m[size - 1] == ord("\n")
+
+                split = 0
+                found = 0
+                while found < insert_line:
+                    pos = m.find(b"\n", split)
+                    if pos == -1:
+                        break
+                    split = pos + 1
+                    found += 1
+
+                if found < insert_line:
+                    # Senza newline finale l'ultima riga conta comunque come riga
+                    line_count = found if ends_with_newline else found + 1
+                    if insert_line > line_count:
+                        raise IndexError(
+                            f"Line number {insert_line} is out of range. File has {line_count} lines."
+                        )
+                    split = size
+
+            data = new_str.encode("utf-8") + b"\n"
+            if not ends_with_newline:
+                data = b"\n" + data
+            self._splice_file(abs_path, f, size, split, split, data)
+        return True
+
+    def _splice_file(self, abs_path: str, f, size: int, start: int, end: int, data: bytes) -> None:
+        """
+        Sostituisce i byte [start, end) del file con data.
+        
+        Dopo il backup, il nuovo contenuto è composto in un file temporaneo
+        copiando nel kernel (sendfile) la parte prima di start e dopo end,
+        portato su disco (fsync) e poi sostituito atomicamente con os.replace.
+        
+        Args:
+            abs_path (str): Il percorso assoluto del file.
+            f: Il file aperto in 'rb'.
+            size (int): La dimensione del file in byte.
+            start (int): L'offset iniziale della parte da sostituire.
+            end (int): L'offset finale (escluso) della parte da sostituire.
+            data (bytes): I byte da scrivere al posto della parte sostituita.
+        """
+        # Create backup before modifying
+        self._backup_file(abs_path)
+
+        tmp_path = self._temp_path(abs_path)
+        try:
+            with open(tmp_path, "wb") as out:
+                self._copy_range(f, out, 0, start)
+                out.write(data)
+                self._copy_range(f, out, end, size - end)
+                out.flush()
+                os.fsync(out.fileno())
+            shutil.copymode(abs_path, tmp_path)
+            os.replace(tmp_path, abs_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def _count_capped(content: str, old_str: str) -> tuple[int, int]:
+        """
+        Conta le occorrenze di una sottostringa fermandosi alla seconda.
         
         Questo è un metodo di utilità interno per supportare la funzione
-        `str_replace`, assicurando che la sostituzione avvenga in modo univoco.
+        `str_replace`, che deve solo distinguere tra nessuna, una o più
+        occorrenze: la scansione termina alla seconda occorrenza invece di
+        percorrere l'intera stringa.
         
         Args:
             content (str): La stringa principale in cui cercare.
             old_str (str): La sottostringa da contare.
             
         Returns:
-            int: Il numero di occorrenze trovate.
+            tuple[int, int]: Il conteggio (0, 1 oppure 2 per due o più
+                             occorrenze) e la posizione della prima
+                             occorrenza (-1 se assente).
+        """
+        if not old_str:
+            # Stessa semantica di str.count: la stringa vuota compare len + 1 volte
+            return min(len(content) + 1, 2), 0
+        first = content.find(old_str)
+        if first == -1:
+            return 0, -1
+        return (1 if content.find(old_str, first + len(old_str)) == -1 else 2), first
+
+    @staticmethod
+    def _iter_lines(f) -> Iterator[str]:
+        """
+        Righe (senza '\n') di un file aperto in lettura, lette a blocchi di
+        COPY_BUFSIZE caratteri, con lo stesso risultato di f.read().split("\n"):
+        dopo un '\n' finale, o per un file vuoto, segue una riga vuota.
+        """
+        pending = ""
+        while True:
+            block = f.read(COPY_BUFSIZE)
+            if not block:
+                yield pending
+                return
+            # split nel C per blocco; l'ultima parte può continuare nel blocco successivo
+            parts = (pending + block).split("\n")
+            pending = parts.pop()
+            yield from parts
+
+    def _iter_numbered(
+        self, abs_path: str, view_range: Optional[List[int]], max_bytes: Optional[int]
+    ) -> Iterator[str]:
+        """
+        Generatore delle righe numerate ('N: testo') di un file, per view e view_iter.
+        
+        Le righe prima di start vengono saltate con itertools.islice e la lettura si
+        ferma a end, senza materializzare l'intero file; solo gli intervalli relativi
+        alla fine del file (start < 1 o end negativo diverso da -1) richiedono la
+        lettura completa. Se max_bytes non è None, si ferma prima della riga con cui
+        l'output unito da '\n' supererebbe max_bytes byte (UTF-8).
+        """
+        start, end = view_range if view_range else (1, -1)
+        try:
+            f = open(abs_path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            raise FileNotFoundError("File not found")
+
+        with f:
+            if start >= 1 and end >= -1:
+                lines = itertools.islice(
+                    self._iter_lines(f), start - 1, None if end == -1 else max(end, start - 1)
+                )
+            else:
+                lines = f.read().split("\n")
+                if end == -1:
+                    end = len(lines)
+                lines = lines[start - 1 : end]
+
+            # map + str.format legato: nessuna f-string valutata per riga nel generatore
+            numbered = map("{0}: {1}".format, itertools.count(start), lines)
+            if max_bytes is None:
+                yield from numbered
+                return
+
+            size = 0
+            for text in numbered:
+                size += len(text.encode("utf-8"))
+                if size > max_bytes:
+                    return
+                yield text
+                size += 1  # separatore "\n" prima della riga successiva
+
+    def view_iter(
+        self,
+        file_path: str,
+        view_range: Optional[List[int]] = None,
+        max_bytes: Optional[int] = VIEW_MAX_BYTES,
+    ) -> Iterator[str]:
+        """
+        Variante in streaming di view per i file: restituisce un iteratore delle
+        righe numerate ('N: testo', senza '\n'), fermandosi al budget di byte.
+        
+        Il file viene letto solo fino all'ultima riga prodotta, quindi per file
+        molto grandi basta consumare le righe necessarie. "\n".join sulle righe
+        dà lo stesso risultato di view (troncato a max_bytes).
+        
+        Args:
+            file_path (str): Il percorso del file da visualizzare.
+            view_range (Optional[List[int]]): Un intervallo di righe come in view.
+            max_bytes (Optional[int]): Il numero massimo di byte (UTF-8) dell'output
+                                       unito da '\n'. Se `None`, nessun limite.
+        
+        Returns:
+            Iterator[str]: Le righe numerate del file.
+            
+        Raises:
+            ValueError: Se il percorso è fuori dalla directory di base (subito).
+            FileNotFoundError: Se il file non esiste (alla prima iterazione).
+            UnicodeDecodeError: Se il file non è un file di testo valido
+                                (durante l'iterazione).
         """
-        return content.count(old_str)
+        return self._iter_numbered(self._validate_path(file_path), view_range, max_bytes)
 
     def view(
-        self, file_path: str, view_range: Optional[List[int]] = None
+        self,
+        file_path: str,
+        view_range: Optional[List[int]] = None,
+        max_bytes: Optional[int] = None,
     ) -> str:
         """
         Legge il contenuto di un file o elenca i contenuti di una directory.
@@ -195,7 +643,8 @@ class TextEditorTool:
         Se il percorso punta a un file, legge il contenuto e restituisce ogni
         riga numerata. Se viene fornito `view_range`, restituisce solo le righe
         comprese nell'intervallo specificato (le righe sono 1-based).
-        Se il percorso è una directory, ne restituisce i contenuti.
+        Se il percorso è una directory, ne restituisce i contenuti (limitati
+        alle voci dell'intervallo `view_range`, se fornito).
         
         Args:
             file_path (str): Il percorso del file o della directory da visualizzare.
@@ -204,6 +653,8 @@ class TextEditorTool:
                                               Se `None`, visualizza l'intero file.
                                               Se l'end è -1, visualizza fino
                                               alla fine del file.
+            max_bytes (Optional[int]): Limite in byte dell'output per i file
+                                       (vedi view_iter). Se `None`, nessun limite.
         
         Returns:
             str: Il contenuto del file formattato con i numeri di riga, o
@@ -214,60 +665,33 @@ class TextEditorTool:
             PermissionError: Se i permessi di lettura sono negati.
             UnicodeDecodeError: Se il file non è un file di testo valido.
         """
-        try:
-            abs_path = self._validate_path(file_path)
-
-            if os.path.isdir(abs_path):
-                try:
-                    return "\n".join(os.listdir(abs_path))
-                except PermissionError:
-                    raise PermissionError(
-                        "Permission denied. Cannot list directory contents."
-                    )
-
-            if not os.path.exists(abs_path):
-                raise FileNotFoundError("File not found")
-
-            with open(abs_path, "r", encoding="utf-8") as f:
-                content = f.read()
-
+        abs_path = self._validate_path(file_path)
+
+        if os.path.isdir(abs_path):
+            return self._view_dir(abs_path, view_range)
+        return self._view_file(abs_path, view_range, max_bytes)
+
+    @staticmethod
+    @_translate_errors("Permission denied. Cannot list directory contents.")
+    def _view_dir(abs_path: str, view_range: Optional[List[int]]) -> str:
+        # Voci lette in streaming; con view_range solo la finestra richiesta
+        with os.scandir(abs_path) as entries:
+            names = (entry.name for entry in entries)
             if view_range:
                 start, end = view_range
-                lines = content.split("\n")
-
-                if end == -1:
-                    end = len(lines)
-
-                selected_lines = lines[start - 1 : end]
+                names = itertools.islice(
+                    names, max(start - 1, 0), None if end == -1 else max(end, 0)
+                )
+            return "\n".join(names)
 
-                result = []
-                for i, line in enumerate(selected_lines, start):
-                    result.append(f"{i}: {line}")
-
-                return "\n".join(result)
-            else:
-                lines = content.split("\n")
-                result = []
-                for i, line in enumerate(lines, 1):
-                    result.append(f"{i}: {line}")
-
-                return "\n".join(result)
-
-        except UnicodeDecodeError:
-            raise UnicodeDecodeError(
-                "utf-8",
-                b"",
-                0,
-                1,
-                "File contains non-text content and cannot be displayed.",
-            )
-        except ValueError as e:
-            raise ValueError(str(e))
-        except PermissionError:
-            raise PermissionError("Permission denied. Cannot access file.")
-        except Exception as e:
-            raise type(e)(str(e))
+    @_translate_errors(
+        "Permission denied. Cannot access file.",
+        decode_message="File contains non-text content and cannot be displayed.",
+    )
+    def _view_file(self, abs_path: str, view_range: Optional[List[int]], max_bytes: Optional[int]) -> str:
+        return "\n".join(self._iter_numbered(abs_path, view_range, max_bytes))
 
+    @_translate_errors("Permission denied. Cannot modify file.")
     def str_replace(self, file_path: str, old_str: str, new_str: str) -> str:
         """
         Sostituisce un'esatta e unica occorrenza di una stringa in un file.
@@ -291,50 +715,46 @@ class TextEditorTool:
                         vengono trovate più di una.
             PermissionError: Se i permessi di scrittura sono negati.
         """
-        try:
-            abs_path = self._validate_path(file_path)
+        abs_path = self._validate_path(file_path)
 
-            if not os.path.exists(abs_path):
-                raise FileNotFoundError("File not found")
+        try:
+            if self._replace_unique_mapped(abs_path, old_str, new_str):
+                return "Successfully replaced text at exactly one location."
 
             with open(abs_path, "r", encoding="utf-8") as f:
                 content = f.read()
+        except FileNotFoundError:
+            raise FileNotFoundError("File not found")
 
-            match_count = self._count_matches(content, old_str)
-
-            if match_count == 0:
-                raise ValueError(
-                    "No match found for replacement. Please check your text and try again."
-                )
-            elif match_count > 1:
-                raise ValueError(
-                    f"Found {match_count} matches for replacement text. Please provide more context to make a unique match."
-                )
-
-            # Create backup before modifying
-            self._backup_file(abs_path)
+        match_count, first = self._count_capped(content, old_str)
 
-            # Perform the replacement
-            new_content = content.replace(old_str, new_str)
+        if match_count == 0:
+            raise ValueError(
+                "No match found for replacement. Please check your text and try again."
+            )
+        elif match_count > 1:
+            # Conteggio completo solo per il messaggio d'errore
+            raise ValueError(
+                f"Found {content.count(old_str)} matches for replacement text. Please provide more context to make a unique match."
+            )
 
-            with open(abs_path, "w", encoding="utf-8") as f:
-                f.write(new_content)
+        # Create backup before modifying
+        self._backup_file(abs_path)
 
-            return "Successfully replaced text at exactly one location."
+        # Perform the replacement, reusing the match position: the chunks are written as-is
+        self._write_file(
+            abs_path, [content[:first], new_str, content[first + len(old_str):]]
+        )
 
-        except ValueError as e:
-            raise ValueError(str(e))
-        except PermissionError:
-            raise PermissionError("Permission denied. Cannot modify file.")
-        except Exception as e:
-            raise type(e)(str(e))
+        return "Successfully replaced text at exactly one location."
 
+    @_translate_errors("Permission denied. Cannot create file.")
     def create(self, file_path: str, file_text: str) -> str:
         """
         Crea un nuovo file con il contenuto specificato.
         
-        Il metodo verifica prima se il file esiste già per evitare sovrascritture
-        accidentali. Crea anche le directory padre se non esistono.
+        Il file viene aperto in modalità esclusiva (O_EXCL), così la creazione fallisce
+        se il file esiste già ed evita sovrascritture accidentali. Crea anche le directory padre se non esistono.
         
         Args:
             file_path (str): Il percorso del nuovo file da creare.
@@ -347,31 +767,28 @@ class TextEditorTool:
             FileExistsError: Se il file esiste già.
             PermissionError: Se i permessi di scrittura sono negati.
         """
-        try:
-            abs_path = self._validate_path(file_path)
+        abs_path = self._validate_path(file_path)
 
-            # Check if file already exists
-            if os.path.exists(abs_path):
-                raise FileExistsError(
-                    "File already exists. Use str_replace to modify it."
-                )
+        # Create parent directories if they don't exist
+        os.makedirs(os.path.dirname(abs_path), exist_ok=True)
 
-            # Create parent directories if they don't exist
-            os.makedirs(os.path.dirname(abs_path), exist_ok=True)
-
-            # Create the file
-            with open(abs_path, "w", encoding="utf-8") as f:
-                f.write(file_text)
+        # Create the file, O_EXCL fails atomically if it already exists
+        data = file_text.encode("utf-8")
+        try:
+            fd = os.open(abs_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        except FileExistsError:
+            raise FileExistsError(
+                "File already exists. Use str_replace to modify it."
+            )
 
-            return f"Successfully created {file_path}"
+        try:
+            self._write_all(fd, data)
+        finally:
+            os.close(fd)
 
-        except ValueError as e:
-            raise ValueError(str(e))
-        except PermissionError:
-            raise PermissionError("Permission denied. Cannot create file.")
-        except Exception as e:
-            raise type(e)(str(e))
+        return f"Successfully created {file_path}"
 
+    @_translate_errors("Permission denied. Cannot modify file.")
     def insert(self, file_path: str, insert_line: int, new_str: str) -> str:
         """
         Inserisce una nuova riga di testo in una posizione specifica di un file.
@@ -396,45 +813,40 @@ class TextEditorTool:
                         valido del file.
             PermissionError: Se i permessi di scrittura sono negati.
         """
-        try:
-            abs_path = self._validate_path(file_path)
-
-            if not os.path.exists(abs_path):
-                raise FileNotFoundError("File not found")
+        abs_path = self._validate_path(file_path)
 
-            # Create backup before modifying
-            self._backup_file(abs_path)
+        try:
+            if self._insert_mapped(abs_path, insert_line, new_str):
+                return f"Successfully inserted text after line {insert_line}"
 
             with open(abs_path, "r", encoding="utf-8") as f:
                 lines = f.readlines()
+        except FileNotFoundError:
+            raise FileNotFoundError("File not found")
+
+        # Create backup before modifying
+        self._backup_file(abs_path)
+
+        # Handle line endings
+        if lines and not lines[-1].endswith("\n"):
+            new_str = "\n" + new_str
+
+        # Insert at the beginning if insert_line is 0
+        if insert_line == 0:
+            lines.insert(0, new_str + "\n")
+        # Insert after the specified line
+        elif insert_line > 0 and insert_line <= len(lines):
+            lines.insert(insert_line, new_str + "\n")
+        else:
+            raise IndexError(
+                f"Line number {insert_line} is out of range. File has {len(lines)} lines."
+            )
 
-            # Handle line endings
-            if lines and not lines[-1].endswith("\n"):
-                new_str = "\n" + new_str
-
-            # Insert at the beginning if insert_line is 0
-            if insert_line == 0:
-                lines.insert(0, new_str + "\n")
-            # Insert after the specified line
-            elif insert_line > 0 and insert_line <= len(lines):
-                lines.insert(insert_line, new_str + "\n")
-            else:
-                raise IndexError(
-                    f"Line number {insert_line} is out of range. File has {len(lines)} lines."
-                )
-
-            with open(abs_path, "w", encoding="utf-8") as f:
-                f.writelines(lines)
-
-            return f"Successfully inserted text after line {insert_line}"
+        self._write_file(abs_path, lines)
 
-        except ValueError as e:
-            raise ValueError(str(e))
-        except PermissionError:
-            raise PermissionError("Permission denied. Cannot modify file.")
-        except Exception as e:
-            raise type(e)(str(e))
+        return f"Successfully inserted text after line {insert_line}"
 
+    @_translate_errors("Permission denied. Cannot write to file.")
     def undo_edit(self, file_path: str) -> str:
         """
         Annulla l'ultima modifica a un file, ripristinando il backup più recente.
@@ -452,33 +864,9 @@ class TextEditorTool:
             FileNotFoundError: Se il file originale o un backup non esiste.
             PermissionError: Se i permessi di scrittura sono negati.
         """
-        try:
-            abs_path = self._validate_path(file_path)
-
-            if not os.path.exists(abs_path):
-                raise FileNotFoundError(f"Original file not found at {abs_path}")
-            
-            return self._restore_backup(abs_path)
-
-        except ValueError as e:
-            raise ValueError(str(e))
-        except PermissionError:
-            raise PermissionError("Permission denied. Cannot write to file.")
-        except Exception as e:
-            raise type(e)(str(e))
-        try:
-            abs_path = self._validate_path(file_path)
+        abs_path = self._validate_path(file_path)
 
-            if not os.path.exists(abs_path):
-                raise FileNotFoundError("File not found")
-
-            return self._restore_backup(abs_path)
-
-        except ValueError as e:
-            raise ValueError(str(e))
-        except FileNotFoundError:
-            raise FileNotFoundError("No previous edits to undo")
-        except PermissionError:
-            raise PermissionError("Permission denied. Cannot restore file.")
-        except Exception as e:
-            raise type(e)(str(e))
\ No newline at end of file
+        if not os.path.exists(abs_path):
+            raise FileNotFoundError(f"Original file not found at {abs_path}")
+        
+        return self._restore_backup(abs_path)
@@ -1,21 +1,61 @@
 
-import json
-from tools.tool_use import run_tool
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import fast_json
+
+MAX_WORKERS = 32
+
+
+def _run_group(run_tool, group, failure):
+    # Invocations of the same group (same file) run in order on one worker.
+    # Once any invocation of the batch has failed, the calls not started yet are skipped
+    outputs = []
+    for name, args in group:
+        if failure:
+            break
+        try:
+            outputs.append({"tool_name": name, "output": run_tool(name, args)})
+        except Exception as e:
+            failure.append(e)
+            raise
+    return outputs
 
 def run_batch(invocations=[]):
-    batch_output = []
-    
-    for invocation in invocations:
-        name = invocation["name"]
-        args = json.loads(invocation["arguments"])
-        
-        tool_output = run_tool(name, args)
-        
-        batch_output.append({
-            "tool_name": name,
-            "output": tool_output
-        })
-    
+    # Imported here: tool_use imports this module to register batch_tool
+    from tools.tool_use import run_tool, editor_path_key
+
+    # Arguments are parsed up front, in the calling thread
+    calls = [
+        (invocation["name"], fast_json.loads(invocation["arguments"]))
+        for invocation in invocations
+    ]
+    if not calls:
+        return []
+
+    # Edits on the same file keep their relative order, everything else runs concurrently.
+    # Paths are grouped by their real path, so "a.txt", "./a.txt" and an absolute path share a group
+    groups = {}
+    for index, (name, args) in enumerate(calls):
+        key = editor_path_key(name, args)
+        groups.setdefault(key if key is not None else ("call", index), []).append(index)
+
+    # First exception raised by an invocation: the calls not started yet are skipped and it is
+    # re-raised once the running ones finish. Unlike a sequential run, calls already in flight
+    # on other workers when it happens still complete
+    failure = []
+    batch_output = [None] * len(calls)
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(groups))) as executor:
+        futures = [
+            (indexes, executor.submit(_run_group, run_tool, [calls[i] for i in indexes], failure))
+            for indexes in groups.values()
+        ]
+        for indexes, future in futures:
+            if future.exception() is None:
+                for index, output in zip(indexes, future.result()):
+                    batch_output[index] = output
+
+    if failure:
+        raise failure[0]
     return batch_output
 
 batch_tool_schema = {
@@ -1,9 +1,14 @@
-import datetime
+from datetime import datetime
 from anthropic.types import ToolParam
 
-def get_current_datetime(date_format="%Y-%m-%d %H:%M:%S"):
+_DEFAULT_FMT = "%Y-%m-%d %H:%M:%S"
+
+def get_current_datetime(date_format=_DEFAULT_FMT):
     if not date_format:
         raise ValueError("date_format cannot be empty")
+    if date_format == _DEFAULT_FMT:
+        # Same output as strftime(_DEFAULT_FMT), without parsing the format string
+        return datetime.now().isoformat(sep=" ", timespec="seconds")
     return datetime.now().strftime(date_format)
 
 
@@ -16,7 +21,7 @@ get_current_datetime_schema = ToolParam({
             "date_format": {
                 "type": "string",
                 "description": "A string specifying the format of the returned datetime. Uses Python's strftime format codes.",
-                "default": "%Y-%m-%d %H:%M:%S"
+                "default": _DEFAULT_FMT
             }
         },
         "required": []
@@ -1,50 +1,67 @@
-import json
+import os
+
+from utils import fast_json
 from tools.datetime_tool import get_current_datetime
 from tools.batch_tool import run_batch
 from tools.TextEditorTool import TextEditorTool
 
 text_editor_tool = TextEditorTool()
 
+# Text editor commands: command name -> call on the shared TextEditorTool
+EDITOR_CMDS = {
+    "view": lambda i: text_editor_tool.view(i["path"], i.get("view_range")),
+    "str_replace": lambda i: text_editor_tool.str_replace(i["path"], i["old_str"], i["new_str"]),
+    "create": lambda i: text_editor_tool.create(i["path"], i["file_text"]),
+    "insert": lambda i: text_editor_tool.insert(i["path"], i["insert_line"], i["new_str"]),
+    "undo_edit": lambda i: text_editor_tool.undo_edit(i["path"]),
+}
+
+def editor_path_key(tool_name, tool_input):
+    # Real path of the file an editor call works on (None for other tools): calls sharing it must not run concurrently
+    path = tool_input.get("path") if tool_name == "str_replace_editor" else None
+    if path is None:
+        return None
+    return os.path.realpath(os.path.join(text_editor_tool.base_dir, path))
+
+def _editor_dispatch(tool_input):
+    command = tool_input["command"]
+    handler = EDITOR_CMDS.get(command)
+    if handler is None:
+        raise Exception(f"Unknown text editor command: {command}")
+    return handler(tool_input)
+
+# list of available Tools to run: tool name -> callable taking the tool input
+DISPATCH = {
+    "get_current_datetime": lambda i: get_current_datetime(**i),
+    "batch_tool": lambda i: run_batch(**i),
+    "str_replace_editor": _editor_dispatch,
+    # "another_tool": lambda i: another_tool(**i),
+    # Add more tools as needed
+}
+
 def run_tool(tool_name, tool_input):
-    
-    # list of available Tools to run 
-    if tool_name == "get_current_datetime":
-        return get_current_datetime(**tool_input)
-    
-    elif tool_name == "batch_tool":
-        return run_batch(**tool_input)
-    
-    elif tool_name == "str_replace_editor":
-        command = tool_input["command"]
-        if command == "view":
-            return text_editor_tool.view(
-                tool_input["path"], tool_input.get("view_range")
-            )
-        elif command == "str_replace":
-            return text_editor_tool.str_replace(
-                tool_input["path"], tool_input["old_str"], tool_input["new_str"]
-            )
-        elif command == "create":
-            return text_editor_tool.create(
-                tool_input["path"], tool_input["file_text"]
-            )
-        elif command == "insert":
-            return text_editor_tool.insert(
-                tool_input["path"],
-                tool_input["insert_line"],
-                tool_input["new_str"],
-            )
-        elif command == "undo_edit":
-            return text_editor_tool.undo_edit(tool_input["path"])
-        else:
-            raise Exception(f"Unknown text editor command: {command}")
-    else:
+    handler = DISPATCH.get(tool_name)
+    if handler is None:
         raise Exception(f"Unknown tool name: {tool_name}")
-    '''
-    elif tool_name == "another_tool":
-        return another_tool(**tool_input)
-    # Add more tools as needed
-    # '''
+    return handler(tool_input)
+
+def run_tool_request(tool_request):
+    # Run a single tool_use block and wrap its output in a tool_result block
+    try:
+        tool_output = run_tool(tool_request.name, tool_request.input)
+        return {
+            "type": "tool_result",
+            "tool_use_id": tool_request.id,
+            "content": fast_json.dumps(tool_output),
+            "is_error": False,
+        }
+    except Exception as e:
+        return {
+            "type": "tool_result",
+            "tool_use_id": tool_request.id,
+            "content": f"Error: {e}",
+            "is_error": True,
+        }
 
 def run_tools(message):
     #Input calls
@@ -52,25 +69,4 @@ def run_tools(message):
         block for block in message.content if block.type == "tool_use"
     ]
     # Output result from calls
-    tool_result_blocks = []
-
-    for tool_request in tool_requests:
-        try:
-            tool_output = run_tool(tool_request.name, tool_request.input)
-            tool_result_block = {
-                "type": "tool_result",
-                "tool_use_id": tool_request.id,
-                "content": json.dumps(tool_output),
-                "is_error": False,
-            }
-        except Exception as e:
-            tool_result_block = {
-                "type": "tool_result",
-                "tool_use_id": tool_request.id,
-                "content": f"Error: {e}",
-                "is_error": True,
-            }
-
-        tool_result_blocks.append(tool_result_block)
-
-    return tool_result_blocks
\ No newline at end of file
+    return [run_tool_request(tool_request) for tool_request in tool_requests]
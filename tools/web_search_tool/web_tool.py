@@ -1,7 +1,109 @@
+import functools
 import json
 import os
-from typing import Dict, List, Optional, Union
+import re
+import threading
+from dataclasses import dataclass, field, replace
+from types import MappingProxyType
+from typing import Any, ClassVar, Dict, FrozenSet, List, Mapping, Optional, Tuple, Union
 from pathlib import Path
+from urllib.parse import urlsplit
+
+from utils import fast_json
+
+# ijson (opzionale) per leggere in streaming liste di domini molto grandi
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# tldextract (opzionale) per ridurre i domini alla forma registrabile (eTLD+1)
+try:
+    import tldextract
+except ImportError:
+    tldextract = None
+
+# msgpack (opzionale) per il sidecar binario accanto ai JSON di configurazione
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Sopra questa dimensione, con ijson disponibile, le liste di domini sono lette in streaming
+DOMAIN_STREAM_MIN_BYTES = 1024 * 1024
+
+# Separatori di "Città, Paese" / "Città/Paese" in find_localization
+_CITY_COUNTRY_SEP = re.compile(r"\s*[,/]\s*")
+
+
+@functools.lru_cache(maxsize=1)
+def _tld_extractor():
+    # Solo la Public Suffix List inclusa nel pacchetto: nessuna rete, risultato deterministico
+    return tldextract.TLDExtract(suffix_list_urls=(), cache_dir=None)
+
+def _canon(domain: str) -> str:
+    """
+    Forma canonica di un dominio per i controlli di appartenenza: minuscolo, senza
+    punto finale e, con tldextract, ridotto a eTLD+1 ('scholar.google.com' ->
+    'google.com', 'www.ox.ac.uk' -> 'ox.ac.uk').
+    
+    Compromesso di precisione: i sottodomini confluiscono nel dominio registrabile,
+    quindi un set canonico di domini consentiti accetta anche gli altri sottodomini
+    dello stesso dominio. In cambio il set è più piccolo e ogni verifica è un solo
+    lookup. Senza tldextract si applica solo la normalizzazione del testo.
+    """
+    domain = domain.strip().rstrip(".").lower()
+    if tldextract is None:
+        return domain
+    ext = _tld_extractor()(domain)
+    if ext.domain and ext.suffix:
+        return f"{ext.domain}.{ext.suffix}"
+    return domain
+
+def _host_suffixes(url: str):
+    """
+    Host dell'URL (minuscolo, senza punto finale) e ogni suo suffisso di etichette:
+    'https://a.b.com/x' -> 'a.b.com', 'b.com', 'com'. Accetta anche un host nudo.
+    """
+    host = urlsplit(url if "//" in url else "//" + url).hostname
+    if not host:
+        return
+    host = host.rstrip(".")
+    yield host
+    start = host.find(".")
+    while start != -1:
+        host = host[start + 1:]
+        yield host
+        start = host.find(".")
+
+def _freeze(value: Any) -> Any:
+    """Copia in sola lettura: dict -> MappingProxyType e list -> tuple, ricorsivamente."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    """
+    Stato in cache di un WebSearchTool, pubblicato come unico oggetto immutabile.
+    
+    Ogni parte è None finché non viene caricata; un caricamento pubblica un nuovo
+    snapshot (dataclasses.replace) al posto del precedente. memo raccoglie i
+    risultati derivati (schemi, user_location, riassunto) ed è nuovo a ogni
+    clear_cache, quindi un calcolo concorrente non scrive mai nello stato nuovo.
+    """
+    allowed_domains: Optional[Tuple[str, ...]] = None
+    allowed_domains_set: Optional[FrozenSet[str]] = None
+    blocked_domains: Optional[Tuple[str, ...]] = None
+    blocked_domains_set: Optional[FrozenSet[str]] = None
+    localizations: Optional[List[Dict]] = None
+    # (per nome, per (città, paese), per regione), chiavi casefold
+    localization_index: Optional[Tuple[Dict[str, Mapping], Dict[Tuple[str, str], Mapping], Dict[str, Mapping]]] = None
+    available_locations: Optional[Tuple[Mapping, ...]] = None
+    memo: Dict[Any, Any] = field(default_factory=dict, compare=False)
 
 
 class WebSearchTool:
@@ -12,24 +114,45 @@ class WebSearchTool:
     basati sulla documentazione ufficiale Anthropic.
     """
     
-    # Modelli supportati dalla documentazione ufficiale
-    SUPPORTED_MODELS = [
+    # Solo lo stato per istanza: niente __dict__ per le istanze create a ogni richiesta.
+    # Le costanti sotto restano attributi di classe
+    __slots__ = (
+        "config_dir",
+        "allowed_domains_file",
+        "blocked_domains_file",
+        "localizations_file",
+        "_snapshot",
+        "_lock",
+        "_dirents",
+    )
+    
+    # Modelli supportati dalla documentazione ufficiale (immutabili: i getter li restituiscono senza copia)
+    SUPPORTED_MODELS: ClassVar[Tuple[str, ...]] = (
         "claude-3-7-sonnet-20250219",
         "claude-3-5-sonnet-latest", 
         "claude-3-5-haiku-latest"
-    ]
+    )
+    
+    # Famiglie supportate (es. "claude-3-7-sonnet"), calcolate una volta: una sola
+    # chiamata str.startswith(tuple) per validazione, più un match esatto O(1)
+    SUPPORTED_PREFIXES = tuple("-".join(m.split("-")[:4]) for m in SUPPORTED_MODELS)
+    _SUPPORTED_MODEL_SET = frozenset(SUPPORTED_MODELS)
     
     # Schema version dalla documentazione
     SCHEMA_VERSION = "web_search_20250305"
     
     # Pricing dalla documentazione ufficiale
-    PRICING_INFO = {
+    PRICING_INFO: ClassVar[Mapping[str, Any]] = MappingProxyType({
         "cost_per_1000_searches": 10.00,
         "currency": "USD",
         "additional_costs": "Standard token costs for search-generated content",
         "billing_note": "Each web search counts as one use, regardless of results returned",
         "error_billing": "No billing for failed searches"
-    }
+    })
+    
+    # JSON già letti, condivisi tra le istanze del processo:
+    # percorso assoluto -> (st_mtime_ns, st_size, contenuto). Il contenuto è da non modificare
+    _PARSE_CACHE: Dict[str, Tuple[int, int, Any]] = {}
     
     def __init__(
         self,
@@ -54,19 +177,41 @@ class WebSearchTool:
         self.blocked_domains_file = blocked_domains_file
         self.localizations_file = localizations_file
         
-        # Cache per i dati caricati
-        self._allowed_domains_cache = None
-        self._blocked_domains_cache = None
-        self._localizations_cache = None
+        # Cache per i dati caricati: letture senza lock sullo snapshot corrente,
+        # caricamenti serializzati dal lock (rientrante: un indice carica i propri dati)
+        self._snapshot = _Snapshot()
+        self._lock = threading.RLock()
         
         # Crea directory se richiesto
         if auto_create_config_dir:
             self.config_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Impronte (stat) dei tre file di configurazione, raccolte con una sola scansione
+        # della directory e consumate dal primo caricamento di ciascun file
+        self._dirents = self._scan_config_files()
+    
+    def _scan_config_files(self) -> Dict[str, os.stat_result]:
+        """Restituisce nome -> stat dei file di configurazione attesi presenti in config_dir."""
+        expected = {self.allowed_domains_file, self.blocked_domains_file, self.localizations_file}
+        try:
+            with os.scandir(self.config_dir) as entries:
+                return {
+                    entry.name: entry.stat()
+                    for entry in entries
+                    if entry.name in expected and entry.is_file()
+                }
+        except (FileNotFoundError, NotADirectoryError):
+            return {}
     
     def _load_json_config(self, filename: str) -> Union[List, Dict]:
         """
         Carica un file JSON di configurazione.
         
+        Il contenuto letto viene riusato da tutte le istanze finché mtime e
+        dimensione del file non cambiano (vedi invalidate_parse_cache).
+        Con msgpack il JSON decodificato viene salvato in un sidecar .msgpack
+        accanto al file e, finché non è più vecchio del JSON, letto al suo posto.
+        
         Args:
             filename (str): Nome del file JSON
             
@@ -80,8 +225,23 @@ class WebSearchTool:
         file_path = self.config_dir / filename
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            # Impronta presa prima della lettura: se il file cambia nel frattempo,
+            # la voce in cache risulta vecchia e viene riletta alla prossima chiamata
+            # L'impronta della scansione iniziale vale solo per il primo caricamento:
+            # dopo clear_cache il file viene rivalutato con un nuovo stat
+            st = self._dirents.pop(filename, None) or file_path.stat()
+            key = str(file_path.resolve())
+            cached = self._PARSE_CACHE.get(key)
+            if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+                return cached[2]
+            
+            data = self._read_sidecar(file_path, st)
+            if data is None:
+                # Un solo read_bytes: il parser (orjson se disponibile) decodifica direttamente i byte
+                data = fast_json.loads(file_path.read_bytes())
+                self._write_sidecar(file_path, data)
+            self._PARSE_CACHE[key] = (st.st_mtime_ns, st.st_size, data)
+            return data
         except FileNotFoundError:
             raise FileNotFoundError(
                 f"File di configurazione non trovato: {file_path}\n"
@@ -93,32 +253,186 @@ class WebSearchTool:
                 e.doc, e.pos
             )
     
+    @staticmethod
+    def _read_sidecar(file_path: Path, st: os.stat_result) -> Optional[Union[List, Dict]]:
+        """Contenuto del sidecar .msgpack se esiste e non è più vecchio del JSON, altrimenti None."""
+        if msgpack is None:
+            return None
+        sidecar = file_path.with_suffix(".msgpack")
+        try:
+            if sidecar.stat().st_mtime_ns < st.st_mtime_ns:
+                return None
+            return msgpack.unpackb(sidecar.read_bytes())
+        except (OSError, ValueError):
+            # Sidecar assente, illeggibile o corrotto: si torna al JSON
+            return None
+    
+    @staticmethod
+    def _write_sidecar(file_path: Path, data: Union[List, Dict]) -> None:
+        """Rigenera il sidecar .msgpack in modo atomico (file temporaneo, fsync, rename)."""
+        if msgpack is None:
+            return
+        sidecar = file_path.with_suffix(".msgpack")
+        tmp = sidecar.with_name(f".{sidecar.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp, "wb") as f:
+                f.write(msgpack.packb(data))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, sidecar)
+        except OSError:
+            # Directory in sola lettura o disco pieno: il sidecar è solo un'ottimizzazione
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+    
+    def _file_size(self, filename: str) -> int:
+        """Dimensione di un file di configurazione (0 se assente), dalla scansione iniziale se disponibile."""
+        st = self._dirents.get(filename)
+        if st is not None:
+            return st.st_size
+        try:
+            return (self.config_dir / filename).stat().st_size
+        except FileNotFoundError:
+            return 0
+    
+    @classmethod
+    def invalidate_parse_cache(cls) -> None:
+        """Svuota la cache dei JSON condivisa tra le istanze, forzando una nuova lettura."""
+        cls._PARSE_CACHE.clear()
+    
+    def _load_domains(self, filename: str) -> Tuple[Tuple[str, ...], FrozenSet[str]]:
+        """
+        Carica una lista di domini: tupla senza duplicati (ordine del file) e frozenset
+        delle forme canoniche (vedi _canon).
+        
+        I file grandi (>= DOMAIN_STREAM_MIN_BYTES) vengono letti in streaming con
+        ijson, se installato: i duplicati sono scartati man mano, senza
+        materializzare prima l'intera lista JSON.
+        """
+        file_path = self.config_dir / filename
+        if ijson is not None and self._file_size(filename) >= DOMAIN_STREAM_MIN_BYTES:
+            # Come in _load_json_config, l'impronta iniziale vale solo per il primo caricamento:
+            # dopo clear_cache la scelta tra streaming e parsing si basa su un nuovo stat
+            self._dirents.pop(filename, None)
+            try:
+                with open(file_path, 'rb') as f:
+                    domains = tuple(dict.fromkeys(ijson.items(f, 'item')))
+            except ijson.JSONError as e:
+                raise json.JSONDecodeError(
+                    f"Errore nel parsing JSON del file {file_path}: {e}", "", 0
+                )
+        else:
+            domains = tuple(dict.fromkeys(self._load_json_config(filename)))
+        # Lo schema usa i domini così come sono; il set contiene le forme canoniche
+        return domains, frozenset(map(_canon, domains))
+    
+    def _load_part(self, part: str, build) -> _Snapshot:
+        """
+        Carica una parte dello snapshot se manca ancora, e restituisce lo snapshot aggiornato.
+        
+        Il controllo viene ripetuto sotto lock, così thread concorrenti caricano
+        ogni file una volta sola; build() restituisce i campi da pubblicare.
+        """
+        with self._lock:
+            if getattr(self._snapshot, part) is None:
+                values = build()
+                # build() può aver pubblicato altre parti: si parte dallo snapshot corrente
+                self._snapshot = replace(self._snapshot, **values)
+            return self._snapshot
+    
+    def _memo(self, key: Any, build) -> Any:
+        """Risultato derivato memorizzato nello snapshot corrente (svuotato da clear_cache)."""
+        memo = self._snapshot.memo
+        value = memo.get(key)
+        if value is None:
+            value = memo.setdefault(key, build())
+        return value
+    
+    def _build_allowed_domains(self) -> Dict:
+        domains, domain_set = self._load_domains(self.allowed_domains_file)
+        return {"allowed_domains": domains, "allowed_domains_set": domain_set}
+    
+    def _build_blocked_domains(self) -> Dict:
+        domains, domain_set = self._load_domains(self.blocked_domains_file)
+        return {"blocked_domains": domains, "blocked_domains_set": domain_set}
+    
     @property
-    def allowed_domains(self) -> List[str]:
-        """Carica e restituisce la lista dei domini consentiti (con cache)."""
-        if self._allowed_domains_cache is None:
-            self._allowed_domains_cache = self._load_json_config(self.allowed_domains_file)
-        return self._allowed_domains_cache
+    def allowed_domains(self) -> Tuple[str, ...]:
+        """Carica e restituisce i domini consentiti, senza duplicati (con cache)."""
+        snapshot = self._snapshot
+        if snapshot.allowed_domains is None:
+            snapshot = self._load_part("allowed_domains", self._build_allowed_domains)
+        return snapshot.allowed_domains
     
     @property
-    def blocked_domains(self) -> List[str]:
-        """Carica e restituisce la lista dei domini bloccati (con cache)."""
-        if self._blocked_domains_cache is None:
-            self._blocked_domains_cache = self._load_json_config(self.blocked_domains_file)
-        return self._blocked_domains_cache
+    def blocked_domains(self) -> Tuple[str, ...]:
+        """Carica e restituisce i domini bloccati, senza duplicati (con cache)."""
+        snapshot = self._snapshot
+        if snapshot.blocked_domains is None:
+            snapshot = self._load_part("blocked_domains", self._build_blocked_domains)
+        return snapshot.blocked_domains
+    
+    @property
+    def allowed_domains_set(self) -> FrozenSet[str]:
+        """Domini consentiti in forma canonica (vedi _canon), per verifiche di appartenenza O(1)."""
+        snapshot = self._snapshot
+        if snapshot.allowed_domains_set is None:
+            snapshot = self._load_part("allowed_domains_set", self._build_allowed_domains)
+        return snapshot.allowed_domains_set
+    
+    @property
+    def blocked_domains_set(self) -> FrozenSet[str]:
+        """Domini bloccati in forma canonica (vedi _canon), per verifiche di appartenenza O(1)."""
+        snapshot = self._snapshot
+        if snapshot.blocked_domains_set is None:
+            snapshot = self._load_part("blocked_domains_set", self._build_blocked_domains)
+        return snapshot.blocked_domains_set
+    
+    def is_blocked(self, url: str) -> bool:
+        """
+        Indica se l'host dell'URL (o un suo dominio padre) è tra i domini bloccati.
+        
+        Ogni suffisso dell'host è un lookup nel set canonico, quindi il costo
+        dipende dal numero di etichette dell'host e non dalla lunghezza della
+        lista: adatto a controllare molti URL in blocco.
+        
+        Args:
+            url (str): URL completo o host
+            
+        Returns:
+            bool: True se il dominio è bloccato
+        """
+        return not self.blocked_domains_set.isdisjoint(_host_suffixes(url))
+    
+    def is_allowed(self, url: str) -> bool:
+        """
+        Indica se l'host dell'URL (o un suo dominio padre) è tra i domini consentiti.
+        
+        Args:
+            url (str): URL completo o host
+            
+        Returns:
+            bool: True se il dominio è consentito
+        """
+        return not self.allowed_domains_set.isdisjoint(_host_suffixes(url))
     
     @property
     def localizations(self) -> List[Dict]:
         """Carica e restituisce la lista delle localizzazioni (con cache)."""
-        if self._localizations_cache is None:
-            self._localizations_cache = self._load_json_config(self.localizations_file)
-        return self._localizations_cache
+        snapshot = self._snapshot
+        if snapshot.localizations is None:
+            snapshot = self._load_part(
+                "localizations",
+                lambda: {"localizations": self._load_json_config(self.localizations_file)},
+            )
+        return snapshot.localizations
     
     def clear_cache(self) -> None:
         """Pulisce la cache dei file caricati per forzare il ricaricamento."""
-        self._allowed_domains_cache = None
-        self._blocked_domains_cache = None
-        self._localizations_cache = None
+        with self._lock:
+            self._snapshot = _Snapshot()
     
     def validate_model(self, model: str) -> bool:
         """
@@ -130,43 +444,77 @@ class WebSearchTool:
         Returns:
             bool: True se supportato
         """
-        return any(
-            model.startswith('-'.join(supported.split('-')[0:3])) 
-            for supported in self.SUPPORTED_MODELS
-        )
+        return model in self._SUPPORTED_MODEL_SET or model.startswith(self.SUPPORTED_PREFIXES)
     
-    def find_localization(self, location_name: str) -> Optional[Dict]:
+    def find_localization(self, location_name: str) -> Optional[Mapping]:
         """
         Trova una localizzazione per nome (case-insensitive).
         
+        Oltre al nome accetta "Città, Paese" o "Città/Paese" (es. "Rome, Italy")
+        e il nome della regione: ogni forma è un solo lookup in un indice
+        costruito una volta dopo il caricamento, provati in quest'ordine.
+        
         Args:
-            location_name (str): Nome della località
+            location_name (str): Nome della località, città e paese, o regione
             
         Returns:
-            Optional[Dict]: Configurazione della località o None se non trovata
+            Optional[Mapping]: Configurazione della località (in sola lettura)
+                               o None se non trovata
         """
-        return next(
-            (loc for loc in self.localizations 
-             if loc["name"].lower() == location_name.lower()),
-            None
-        )
+        by_name, by_city_country, by_region = self._loc_index()
+        key = location_name.strip().casefold()
+        
+        location = by_name.get(key)
+        if location is None:
+            parts = _CITY_COUNTRY_SEP.split(key)
+            if len(parts) == 2:
+                location = by_city_country.get((parts[0], parts[1]))
+        if location is None:
+            location = by_region.get(key)
+        return location
     
-    def get_available_locations(self) -> List[Dict]:
+    def _loc_index(self) -> Tuple[Dict, Dict, Dict]:
+        """Indici (nome, (città, paese), regione) -> localizzazione, costruiti una volta dopo il caricamento."""
+        snapshot = self._snapshot
+        if snapshot.localization_index is None:
+            snapshot = self._load_part("localization_index", self._build_loc_index)
+        return snapshot.localization_index
+    
+    def _build_loc_index(self) -> Dict:
+        # Un solo passaggio per i tre indici; a parità di chiave vale la prima
+        # localizzazione, come nella ricerca lineare
+        by_name, by_city_country, by_region = {}, {}, {}
+        for loc in self.localizations:
+            view = MappingProxyType(loc)
+            by_name.setdefault(loc["name"].casefold(), view)
+            by_city_country.setdefault((loc["city"].casefold(), loc["country"].casefold()), view)
+            by_region.setdefault(loc["region"].casefold(), view)
+        return {"localization_index": (by_name, by_city_country, by_region)}
+    
+    def get_available_locations(self) -> Tuple[Mapping, ...]:
         """
         Restituisce informazioni riassuntive sulle località disponibili.
         
+        Il riassunto è calcolato una volta dopo il caricamento (fino a clear_cache)
+        e restituito in sola lettura.
+        
         Returns:
-            List[Dict]: Lista con nome, valore strategico e timezone
+            Tuple[Mapping, ...]: Località con nome, valore strategico e timezone
         """
-        return [
-            {
-                "name": loc["name"],
-                "strategic_value": loc.get("strategic_value", "N/A"),
-                "timezone": loc["timezone"],
-                "country": loc["country"]
-            }
-            for loc in self.localizations
-        ]
+        snapshot = self._snapshot
+        if snapshot.available_locations is None:
+            snapshot = self._load_part("available_locations", lambda: {
+                "available_locations": tuple(
+                    MappingProxyType({
+                        "name": loc["name"],
+                        "strategic_value": loc.get("strategic_value", "N/A"),
+                        "timezone": loc["timezone"],
+                        "country": loc["country"]
+                    })
+                    for loc in self.localizations
+                )
+            })
+        return snapshot.available_locations
     
     def create_user_location_config(self, location_name: str) -> Dict:
         """
@@ -181,38 +529,64 @@ class WebSearchTool:
         Raises:
             ValueError: Se la località non è trovata
         """
-        location_config = self.find_localization(location_name)
-        
-        if not location_config:
-            available = [loc["name"] for loc in self.localizations]
-            raise ValueError(
-                f"Località non trovata: {location_name}. "
-                f"Località disponibili: {', '.join(available)}"
-            )
-        
-        return {
-            "type": location_config["type"],
-            "city": location_config["city"],
-            "region": location_config["region"], 
-            "country": location_config["country"],
-            "timezone": location_config["timezone"]
-        }
+        return dict(self._build_user_location(location_name))
+    
+    def _build_user_location(self, location_name: str) -> Dict:
+        """Configurazione user_location memorizzata per nome (casefold), svuotata da clear_cache."""
+        def build():
+            location_config = self.find_localization(location_name)
+            
+            if not location_config:
+                available = [loc["name"] for loc in self.localizations]
+                raise ValueError(
+                    f"Località non trovata: {location_name}. "
+                    f"Località disponibili: {', '.join(available)}"
+                )
+            
+            return {
+                "type": location_config["type"],
+                "city": location_config["city"],
+                "region": location_config["region"], 
+                "country": location_config["country"],
+                "timezone": location_config["timezone"]
+            }
+        return self._memo(("user_location", location_name.casefold()), build)
     
-    def get_pricing_info(self) -> Dict:
-        """Restituisce informazioni sui prezzi del web search tool."""
-        return self.PRICING_INFO.copy()
+    @classmethod
+    def get_pricing_info(cls) -> Mapping[str, Any]:
+        """Restituisce informazioni sui prezzi del web search tool (in sola lettura)."""
+        return cls.PRICING_INFO
     
-    def get_supported_models(self) -> List[str]:
-        """Restituisce la lista dei modelli supportati."""
-        return self.SUPPORTED_MODELS.copy()
+    @classmethod
+    def get_supported_models(cls) -> Tuple[str, ...]:
+        """Restituisce i modelli supportati."""
+        return cls.SUPPORTED_MODELS
     
     def export_config_summary(self) -> Dict:
         """
         Esporta un riassunto completo della configurazione.
         
+        Ogni chiamata restituisce un dict nuovo, decodificato dal JSON già
+        serializzato di export_config_summary_bytes (unica fonte del contenuto):
+        chi deve solo inviarlo in JSON usi direttamente i bytes.
+        
         Returns:
             Dict: Riassunto con statistiche e informazioni
         """
+        return fast_json.loads(self.export_config_summary_bytes())
+    
+    def export_config_summary_bytes(self) -> bytes:
+        """
+        Riassunto della configurazione già serializzato in JSON (bytes), pronto
+        come corpo di una risposta HTTP: costruito e serializzato una volta fino
+        a clear_cache.
+        
+        Returns:
+            bytes: Riassunto in JSON compatto UTF-8
+        """
+        return self._memo(("summary_bytes",), lambda: fast_json.dumpb(self._build_config_summary()))
+    
+    def _build_config_summary(self) -> Dict:
         return {
             "config_directory": str(self.config_dir),
             "files": {
@@ -227,7 +601,7 @@ class WebSearchTool:
             },
             "supported_models": self.SUPPORTED_MODELS,
             "schema_version": self.SCHEMA_VERSION,
-            "pricing": self.PRICING_INFO
+            "pricing": dict(self.PRICING_INFO)
         }
         
     def get_web_search_schema(
@@ -237,10 +611,13 @@ class WebSearchTool:
         use_allowed_domains: bool = True,
         use_blocked_domains: bool = False,
         user_location: Optional[str] = None
-    ) -> Dict:
+    ) -> Mapping:
         """
         Genera lo schema completo per il web search tool.
         
+        Lo schema è memorizzato per combinazione di argomenti (fino a clear_cache)
+        e restituito in sola lettura: per aggiungere campi, copiarlo con .copy().
+        
         Args:
             model (str): Nome del modello Claude
             max_uses (int): Numero massimo di ricerche (default: 5)
@@ -249,11 +626,22 @@ class WebSearchTool:
             user_location (str): Nome della località per la localizzazione
             
         Returns:
-            Dict: Schema completo del web search tool
+            Mapping: Schema completo del web search tool
             
         Raises:
             ValueError: Se ci sono errori di validazione
         """
+        args = (model, max_uses, use_allowed_domains, use_blocked_domains, user_location)
+        return self._memo(("schema", args), lambda: _freeze(self._build_web_search_schema(*args)))
+    
+    def _build_web_search_schema(
+        self,
+        model: str,
+        max_uses: int,
+        use_allowed_domains: bool,
+        use_blocked_domains: bool,
+        user_location: Optional[str]
+    ) -> Dict:
         # Validazione modello
         if not self.validate_model(model):
             raise ValueError(
@@ -280,11 +668,11 @@ class WebSearchTool:
         if use_allowed_domains:
             domains = self.allowed_domains
             if domains:
-                schema["allowed_domains"] = domains
+                schema["allowed_domains"] = list(domains)
         elif use_blocked_domains:
             domains = self.blocked_domains
             if domains:
-                schema["blocked_domains"] = domains
+                schema["blocked_domains"] = list(domains)
         
         # Aggiunta localizzazione se specificata
         if user_location:
@@ -0,0 +1,10 @@
+import functools
+import os
+
+
+@functools.lru_cache(maxsize=1)
+def _ensure_dotenv():
+    """Loads .env once per process, skipped when the API key is already in the environment."""
+    if "ANTHROPIC_API_KEY" not in os.environ:
+        from dotenv import load_dotenv
+        load_dotenv()
@@ -1,16 +1,39 @@
-from dotenv import load_dotenv
-load_dotenv()
+from utils import _ensure_dotenv
+_ensure_dotenv()
 
-from chat_template.chat_functions import chat, add_assistant_message, add_user_message
-import json
+from chat_template.chat_functions import chat, add_assistant_message, add_user_message, text_from_message
+from utils import fast_json
 
-def generate_dataset(client, model, generation_prompt, start_string : str, stop_string : str):
-    """ 
+def _render_prompt(generation_prompt, prompt_vars):
+    # Precompiled templates (string.Template, jinja2.Template) are rendered here, plain strings are used as-is
+    if hasattr(generation_prompt, "render"):
+        return generation_prompt.render(**prompt_vars)
+    if hasattr(generation_prompt, "substitute"):
+        return generation_prompt.substitute(**prompt_vars)
+    return generation_prompt
+
+def generate_dataset(client, model, generation_prompt, start_string : str = None, stop_string : str = None, prompt_vars : dict = None, max_retries : int = 0):
+    """
         Generate a syntethic dataset from a genration prompt.
-        Generation prompt defines the context scenario and generation logic
+        Generation prompt defines the context scenario and generation logic:
+        a str, or a template compiled once by the caller (string.Template / jinja2.Template)
+        rendered with prompt_vars.
+        Responses that are empty or not valid JSON are retried up to max_retries times.
     """
     messages = []
-    add_user_message(messages, generation_prompt)
+    add_user_message(messages, _render_prompt(generation_prompt, prompt_vars or {}))
     add_assistant_message(messages, start_string or "```json")
-    text = chat(model, client, messages, stop_sequences= [stop_string] or ["```"])
-    return json.loads(text)
\ No newline at end of file
+    stop_sequences = [stop_string] if stop_string else ["```"]
+
+    for attempt in range(max_retries + 1):
+        text = text_from_message(chat(model, client, messages, stop_sequences=stop_sequences)).strip()
+        if not text:
+            # Nothing to parse: fail (or retry) without calling the parser
+            if attempt == max_retries:
+                raise ValueError("Empty dataset generation response")
+            continue
+        try:
+            return fast_json.loads(text)
+        except fast_json.JSONDecodeError:
+            if attempt == max_retries:
+                raise
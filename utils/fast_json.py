@@ -0,0 +1,30 @@
+import json
+
+# orjson when available (much faster on both encode and decode), stdlib json otherwise
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, callers can always catch the stdlib one
+JSONDecodeError = json.JSONDecodeError
+
+
+def loads(data):
+    """Parses JSON from str or bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps(obj, indent: bool = False) -> str:
+    """Serializes obj to a JSON string, indented by 2 spaces if indent is True."""
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 if indent else 0
+        return orjson.dumps(obj, option=option).decode("utf-8")
+    return json.dumps(obj, indent=2 if indent else None)
+
+def dumpb(obj) -> bytes:
+    """Serializes obj to compact UTF-8 JSON bytes (e.g. an HTTP response body)."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
@@ -1,19 +1,28 @@
-import json
-from dotenv import load_dotenv
-load_dotenv()
+import functools
+
+from utils import _ensure_dotenv
+_ensure_dotenv()
 
-from anthropic import Anthropic
 from chat_template.chat_functions import chat,add_assistant_message,add_user_message,text_from_message
+from utils import fast_json
 
-client = Anthropic()
 model = "claude-sonnet-4-0"
-messages = []
 
-add_user_message(messages, "Generate a very short dummy person info in json")
-add_assistant_message(messages, "```json") # or (```bash) or (```python)
 
-text = text_from_message(chat(model, client, messages, stop_sequences=["```"]))
+# Nothing runs at import time: the request is sent on the first call and its parsed result reused
+@functools.lru_cache(maxsize=1)
+def generate_dummy_person_json(client=None, model=model):
+    messages = []
+
+    add_user_message(messages, "Generate a very short dummy person info in json")
+    add_assistant_message(messages, "```json") # or (```bash) or (```python)
+
+    # client=None uses the shared pooled client from chat_template/client.py
+    text = text_from_message(chat(model, client, messages, stop_sequences=["```"]))
+
+    # Clean up and parse the JSON
+    return fast_json.loads(text.strip())
 
 
-# Clean up and parse the JSON
-clean_json = json.loads(text.strip())
\ No newline at end of file
+if __name__ == "__main__":
+    print(generate_dummy_person_json())
@@ -1,5 +1,5 @@
-from dotenv import load_dotenv
-load_dotenv()
+from utils import _ensure_dotenv
+_ensure_dotenv()
 
 from anthropic import Anthropic
 from chat_template.chat_functions import chat,add_assistant_message,add_user_message,text_from_message